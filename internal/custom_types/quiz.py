@@ -1,86 +1,110 @@
-from dataclasses import dataclass
-from typing import List, Dict, Any
-import json
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from operator import itemgetter
+from typing import List, Dict, Any, Optional, Tuple
 from internal.repository.course import QuizType
 
+# Fetch each question's constructor arguments in dataclass field order
+_BASE_KEYS = itemgetter("question", "justification")
+_MCQ_KEYS = itemgetter("question", "justification", "options", "correct_answer")
+_FIB_KEYS = itemgetter("question", "justification", "correct_answer")
 
-@dataclass
-class BaseQuestion:
+
+BLANK_MARKER = "_____"
+
+
+def split_blank(question: str) -> Optional[Tuple[str, str]]:
+    """Split a fill in the blank question around its single blank marker, or None."""
+    prefix, marker, suffix = question.partition(BLANK_MARKER)
+    if not marker or BLANK_MARKER in suffix:
+        return None
+    return prefix, suffix
+
+
+def _is_nonblank(text: str) -> bool:
+    """Same as bool(text.strip()) without allocating a stripped copy."""
+    return bool(text) and not text.isspace()
+
+
+@dataclass(slots=True, frozen=True)
+class BaseQuestion(ABC):
     question: str
     justification: str
-
-    def to_dict(self) -> Dict[str, Any]:
-        return {
-            "question": self.question,
-            "justification": self.justification
-        }
+    # Memoized result of validate(); questions are frozen so it never goes stale
+    _valid: Optional[bool] = field(default=None, init=False, repr=False, compare=False)
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'BaseQuestion':
-        return cls(
-            question=data["question"],
-            justification=data["justification"]
-        )
+        return cls(*_BASE_KEYS(data))
 
+    def validate(self) -> bool:
+        if self._valid is None:
+            object.__setattr__(self, "_valid", self._validate())
+        return self._valid
+
+    @abstractmethod
+    def _validate(self) -> bool:
+        """Check the question's fields; validate() memoizes the result."""
 
-@dataclass
+
+@dataclass(slots=True, frozen=True)
 class MultipleChoiceQuestion(BaseQuestion):
     options: List[str]
     correct_answer: int  # Index of the correct answer
 
     def to_dict(self) -> Dict[str, Any]:
         return {
-            **super().to_dict(),
+            "question": self.question,
+            "justification": self.justification,
             "options": self.options,
             "correct_answer": self.correct_answer
         }
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'MultipleChoiceQuestion':
-        return cls(
-            question=data["question"],
-            justification=data["justification"],
-            options=data["options"],
-            correct_answer=data["correct_answer"]
-        )
+        return cls(*_MCQ_KEYS(data))
 
-    def validate(self) -> bool:
+    def _validate(self) -> bool:
+        n_options = len(self.options)
         return (
-            len(self.options) > 1 and
-            0 <= self.correct_answer < len(self.options) and
-            bool(self.question.strip()) and
-            bool(self.justification.strip())
+            n_options > 1 and
+            0 <= self.correct_answer < n_options and
+            _is_nonblank(self.question) and
+            _is_nonblank(self.justification)
         )
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class FillInBlankQuestion(BaseQuestion):
     correct_answer: str
+    # (prefix, suffix) around the blank, split once since questions are frozen;
+    # None unless the question has exactly one blank marker
+    parts: Optional[Tuple[str, str]] = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "parts", split_blank(self.question))
 
     def to_dict(self) -> Dict[str, Any]:
         return {
-            **super().to_dict(),
+            "question": self.question,
+            "justification": self.justification,
             "correct_answer": self.correct_answer
         }
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'FillInBlankQuestion':
-        return cls(
-            question=data["question"],
-            justification=data["justification"],
-            correct_answer=data["correct_answer"]
-        )
+        return cls(*_FIB_KEYS(data))
 
-    def validate(self) -> bool:
+    def _validate(self) -> bool:
         return (
-            "_____" in self.question and
-            bool(self.correct_answer.strip()) and
-            bool(self.question.strip()) and
-            bool(self.justification.strip())
+            BLANK_MARKER in self.question and
+            _is_nonblank(self.correct_answer) and
+            _is_nonblank(self.question) and
+            _is_nonblank(self.justification)
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class Quiz:
     type: QuizType
     questions: List[BaseQuestion]
@@ -93,13 +117,13 @@ class Quiz:
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'Quiz':
-        quiz_type = QuizType(data["type"])
-        question_class = MultipleChoiceQuestion if quiz_type == QuizType.MULTIPLE_CHOICE else FillInBlankQuestion
-        
-        questions = [
-            question_class.from_dict(q) for q in data["questions"]
-        ]
-        
+        raw_type = data["type"]
+        try:
+            quiz_type, from_dict = _FROM_DICT[raw_type]
+        except KeyError:
+            raise ValueError(f"{raw_type!r} is not a valid QuizType") from None
+        questions = list(map(from_dict, data["questions"]))
+
         return cls(type=quiz_type, questions=questions)
 
     def validate(self) -> bool:
@@ -107,3 +131,16 @@ class Quiz:
             return False
             
         return all(q.validate() for q in self.questions)
+
+
+# Resolve the quiz type and question constructor in one lookup. Stored
+# quizzes carry QuizType members while generated ones carry raw values, so
+# both are accepted as keys.
+_MCQ_ENTRY = (QuizType.MULTIPLE_CHOICE, MultipleChoiceQuestion.from_dict)
+_FIB_ENTRY = (QuizType.FILL_IN_THE_BLANK, FillInBlankQuestion.from_dict)
+_FROM_DICT = {
+    QuizType.MULTIPLE_CHOICE: _MCQ_ENTRY,
+    QuizType.MULTIPLE_CHOICE.value: _MCQ_ENTRY,
+    QuizType.FILL_IN_THE_BLANK: _FIB_ENTRY,
+    QuizType.FILL_IN_THE_BLANK.value: _FIB_ENTRY,
+}
@@ -1,16 +1,45 @@
 import logging
-import pdb
+from operator import attrgetter
 from typing import List, Optional, Dict, Any
 
+from tortoise import timezone
+from tortoise.transactions import in_transaction
+
 from internal.repository.course import Course, OutlineSection, LessonType, Quiz, Content
+from internal.utils.cache import LRUCache
+from internal.utils.db import db_handler
 
 logger = logging.getLogger(__name__)
 
+# Seconds a cached course or listing is served before it is reloaded, in case
+# another process wrote to a shared database
+COURSE_CACHE_TTL = 60
+
+# Fully loaded courses keyed by str(course_id). Every write path that touches
+# a course, its sections or their content must call invalidate_course.
+_course_cache = LRUCache(maxsize=128, ttl=COURSE_CACHE_TTL)
+# The partial course listing under a single key. Writes that add, remove or
+# change a course's listed columns must call invalidate_course_list.
+_course_list_cache = LRUCache(maxsize=1, ttl=COURSE_CACHE_TTL)
+
+@db_handler
 class CourseViewHandler:
     @staticmethod
     async def list_courses():
-        """Get all courses"""
-        return await Course.all()
+        """Get all courses
+
+        Only the columns shown on the course listings are loaded, so the
+        returned instances are partial and must not be saved. The listing
+        is cached until invalidate_course_list is called.
+        """
+        courses = _course_list_cache.get("all")
+        if courses is None:
+            courses = await Course.all().only(
+                "id", "title", "description", "duration", "is_active", "target_audience"
+            )
+            _course_list_cache.set("all", courses)
+        # Hand out a copy so callers cannot reorder or trim the cached list
+        return list(courses)
 
     @staticmethod
     async def get_course(course_id: str) -> Course:
@@ -20,23 +49,43 @@ class CourseViewHandler:
             course_id: The ID of the course to retrieve
 
         Returns:
-            Course: The course instance with all related data loaded
+            Course: The course instance with all related data loaded and
+                its outline sections sorted by order
 
         Raises:
             ValueError: If course is not found
         """
+        course = _course_cache.get(str(course_id))
+        if course is not None:
+            return course
+
         course = await Course.get_or_none(id=course_id)
         if not course:
             raise ValueError(f"Course with ID {course_id} not found")
             
-        # Load all related data
-        await course.fetch_related('outline_sections')
+        # Load all related data, batching section content and quizzes in one
+        # query each, so awaiting section.quiz later needs no round trip
+        await course.fetch_related('outline_sections__content', 'outline_sections__quiz')
+        # Sort once here, while the course is cached, so pages can use the
+        # sections in outline order as they are
+        course.outline_sections.related_objects.sort(key=attrgetter("order"))
 
-        for section in course.outline_sections:
-            await section.fetch_related('content')
+        _course_cache.set(str(course_id), course)
+        return course
 
+    @staticmethod
+    def invalidate_course(course_id) -> None:
+        """Drop a course from the get_course cache after it has been modified.
 
-        return course
+        Args:
+            course_id: The ID of the modified course
+        """
+        _course_cache.pop(str(course_id))
+
+    @staticmethod
+    def invalidate_course_list() -> None:
+        """Drop the cached list_courses result after a course is added, removed or edited."""
+        _course_list_cache.clear()
         
     @staticmethod
     async def update_section_details(
@@ -60,12 +109,19 @@ class CourseViewHandler:
         Raises:
             Exception: If there's an error saving the section
         """
-        section.title = title
-        section.description = description
-        section.type = lesson_type
-        section.duration = duration
-        section.topics = topics
-        await section.save()
+        # The section may be the shared cached instance, so write through a
+        # query rather than mutating it, and drop the cache even on failure
+        try:
+            await OutlineSection.filter(id=section.id).update(
+                title=title,
+                description=description,
+                type=lesson_type,
+                duration=duration,
+                topics=topics,
+                updated_at=timezone.now()
+            )
+        finally:
+            CourseViewHandler.invalidate_course(section.course_id)
         
     @staticmethod
     async def update_section_content(
@@ -85,20 +141,28 @@ class CourseViewHandler:
         if section.content is None:
             raise ValueError("Section has no content")
             
-        section.content.markdown = content
-        await section.content.save()
+        try:
+            await Content.filter(id=section.content.id).update(
+                markdown=content,
+                updated_at=timezone.now()
+            )
+        finally:
+            CourseViewHandler.invalidate_course(section.course_id)
 
+@db_handler
 class CourseCreateHandler:
     @staticmethod
     async def init_course(title: str, description: str) -> Course:
         """Initialize a new course with basic details."""
-        return await Course.create(
+        course = await Course.create(
             title=title,
             description=description,
             learning_outcomes=[],
             duration=1.0,
             target_audience=""
         )
+        CourseViewHandler.invalidate_course_list()
+        return course
 
     @staticmethod
     async def update_course(
@@ -110,13 +174,18 @@ class CourseCreateHandler:
         target_audience: str
     ) -> None:
         """Update course details."""
-        course = await Course.get(id=course_id)
-        course.title = title
-        course.description = description
-        course.learning_outcomes = learning_outcomes
-        course.duration = duration
-        course.target_audience = target_audience
-        await course.save()
+        updated = await Course.filter(id=course_id).update(
+            title=title,
+            description=description,
+            learning_outcomes=learning_outcomes,
+            duration=duration,
+            target_audience=target_audience,
+            updated_at=timezone.now()
+        )
+        if not updated:
+            raise ValueError(f"Course with ID {course_id} not found")
+        CourseViewHandler.invalidate_course(course_id)
+        CourseViewHandler.invalidate_course_list()
 
     @staticmethod
     async def set_course_details(
@@ -126,20 +195,54 @@ class CourseCreateHandler:
         duration: float
     ) -> None:
         """Set additional course details."""
-        course = await Course.get(id=course_id)
-        course.learning_outcomes = learning_outcomes.split("\n")
-        course.target_audience = target_audience
-        course.duration = duration
-        await course.save()
+        updated = await Course.filter(id=course_id).update(
+            learning_outcomes=learning_outcomes.split("\n"),
+            target_audience=target_audience,
+            duration=duration,
+            updated_at=timezone.now()
+        )
+        if not updated:
+            raise ValueError(f"Course with ID {course_id} not found")
+        CourseViewHandler.invalidate_course(course_id)
+        CourseViewHandler.invalidate_course_list()
+
+    @staticmethod
+    def outline_to_dicts(outline: List[OutlineSection]) -> List[Dict[str, Any]]:
+        """Convert unsaved outline sections to plain dicts for session state.
+
+        The lesson type is stored as its value. set_course_outline accepts
+        the dicts back.
+        """
+        return [
+            {
+                "order": section.order,
+                "title": section.title,
+                "description": section.description,
+                "type": LessonType(section.type).value,
+                "duration": section.duration,
+                "topics": list(section.topics),
+            }
+            for section in outline
+        ]
 
     @staticmethod
-    async def set_course_outline(course_id: str, outline: List[OutlineSection]) -> None:
-        """Set the course outline."""
+    async def set_course_outline(course_id: str, outline: List[Dict[str, Any]]) -> None:
+        """Set the course outline.
+
+        Args:
+            course_id: The ID of the course
+            outline: Section fields as produced by outline_to_dicts
+        """
         course = await Course.get(id=course_id)
-        for section in outline:
-            section.course = course
-            await section.save()
+        sections = [
+            OutlineSection(**{**fields, "type": LessonType(fields["type"])}, course=course)
+            for fields in outline
+        ]
+        # Insert every section in one statement rather than one save per row
+        await OutlineSection.bulk_create(sections)
+        CourseViewHandler.invalidate_course(course_id)
 
+@db_handler
 class CourseDeleteHandler:
     @staticmethod
     async def delete_course(course_id: str) -> bool:
@@ -152,50 +255,48 @@ class CourseDeleteHandler:
             bool: True if course was deleted, False if course was not found
             
         Raises:
-            Exception: If there's an error during deletion
+            Exception: Any database error raised during deletion, unchanged
         """
+        logger.info("Attempting to delete course with ID: %s", course_id)
+        
+        course = await Course.get_or_none(id=course_id)
+        if not course:
+            logger.warning("Course with ID %s not found", course_id)
+            return False
+
+        logger.info("Found course: %s (ID: %s)", course.title, course_id)
+        
+        # Fetch related sections
+        await course.fetch_related('outline_sections')
+        sections = course.outline_sections
+        logger.info("Found %d sections to delete", len(sections))
+
+        section_ids = [section.id for section in sections]
+        quiz_ids = [section.quiz_id for section in sections if section.quiz_id]
+        content_ids = [section.content_id for section in sections if section.content_id]
+
         try:
-            logger.info(f"Attempting to delete course with ID: {course_id}")
-            
-            course = await Course.get_or_none(id=course_id)
-            if not course:
-                logger.warning(f"Course with ID {course_id} not found")
-                return False
+            async with in_transaction():
+                # Delete sections first so no row still points at a quiz or content
+                logger.info("Deleting sections %s", section_ids)
+                await OutlineSection.filter(id__in=section_ids).delete()
 
-            logger.info(f"Found course: {course.title} (ID: {course_id})")
-            
-            # Fetch related sections
-            await course.fetch_related('outline_sections')
-            logger.info(f"Found {len(course.outline_sections)} sections to delete")
-            
-            # Delete related data for each section
-            for section in course.outline_sections:
-                try:
-                    logger.info(f"Processing section {section.id}: {section.title}")
-                    
-                    # Delete quiz if exists
-                    if section.quiz_id:
-                        logger.info(f"Deleting quiz {section.quiz_id}")
-                        await Quiz.filter(id=section.quiz_id).delete()
-                    
-                    # Delete content if exists
-                    if section.content_id:
-                        logger.info(f"Deleting content {section.content_id}")
-                        await Content.filter(id=section.content_id).delete()
-                    
-                    # Delete the section
-                    logger.info(f"Deleting section {section.id}")
-                    await section.delete()
-                except Exception as e:
-                    logger.error(f"Error deleting section {section.id}: {str(e)}")
-                    raise Exception(f"Failed to delete section {section.id}: {str(e)}")
-
-            # Finally delete the course
-            logger.info(f"Deleting course {course_id}")
-            await course.delete()
-            logger.info(f"Successfully deleted course {course_id}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error in delete_course: {str(e)}")
-            raise Exception(f"Failed to delete course: {str(e)}")
\ No newline at end of file
+                if quiz_ids:
+                    logger.info("Deleting quizzes %s", quiz_ids)
+                    await Quiz.filter(id__in=quiz_ids).delete()
+
+                if content_ids:
+                    logger.info("Deleting content %s", content_ids)
+                    await Content.filter(id__in=content_ids).delete()
+
+                # Finally delete the course
+                logger.info("Deleting course %s", course_id)
+                await course.delete()
+        except Exception:
+            logger.exception("delete_course failed for %s", course_id)
+            raise
+
+        CourseViewHandler.invalidate_course(course_id)
+        CourseViewHandler.invalidate_course_list()
+        logger.info("Successfully deleted course %s", course_id)
+        return True
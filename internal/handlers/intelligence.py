@@ -1,24 +1,19 @@
+import asyncio
 import logging
 import os
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from smolagents import CodeAgent, HfApiModel, ToolCallingAgent, tool, LiteLLMModel
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+import orjson
+from smolagents import LiteLLMModel, Tool, ToolCallingAgent
+from smolagents.agents import ActionStep
+
+from internal.custom_types.quiz import MultipleChoiceQuestion, FillInBlankQuestion
 from internal.handlers.course import CourseViewHandler
 from internal.intelligence.tools.retriever import RetrieverTool
-from internal.utils.storage import StorageHandler
-
-from langchain.docstore.document import Document
-
-from smolagents import Tool
-
-import json
-from openai import api_key
-from smolagents import ToolCallingAgent
-from typing import List, Dict, Any, Tuple
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
 from internal.repository.course import LessonType, OutlineSection, Course, Content
-from internal.handlers.section import SectionViewHandler
+from internal.utils.cache import LRUCache
+from internal.utils.db import db_handler
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +22,260 @@ OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 if not OPENAI_API_KEY:
     raise ValueError("OPENAI_API_KEY environment variable is not set")
 
+# Loaded retriever tools keyed by str(course_id); building one reads the
+# FAISS index from disk, or embeds every uploaded document on first use
+_retriever_cache = LRUCache(maxsize=64)
+# One lock per course, so building one course's index never holds up another's
+_retriever_locks: Dict[str, threading.Lock] = {}
+
+
+def _retriever_lock(course_id: str) -> threading.Lock:
+    # setdefault is atomic, so concurrent callers always share one lock
+    return _retriever_locks.setdefault(course_id, threading.Lock())
+
+
+def _load_retriever(course_id: str) -> RetrieverTool:
+    """Load a course's retriever into the cache; run in a worker thread.
+
+    The lock is taken and released in this thread, so cancelling the
+    awaiting coroutine can never leave it held.
+    """
+    with _retriever_lock(course_id):
+        # Another caller may have loaded it while this one waited
+        retriever_tool = _retriever_cache.get(course_id)
+        if retriever_tool is None:
+            retriever_tool = asyncio.run(RetrieverTool.from_course_id(course_id))
+            _retriever_cache.set(course_id, retriever_tool)
+    return retriever_tool
+
+
+def _rebuild_retriever(course_id: str) -> None:
+    """Rebuild and cache a course's retrieval index; run in a worker thread."""
+    with _retriever_lock(course_id):
+        # Stop serving the old index even if the rebuild below fails
+        _retriever_cache.pop(course_id)
+        _retriever_cache.set(course_id, asyncio.run(RetrieverTool.prepare_course_index(course_id)))
+
+# Lesson type values the outline agent may emit
+_LESSON_TYPES = {lesson_type.value: lesson_type for lesson_type in LessonType}
+
+# Upper bound on linked-section markdown sent to the quiz generator
+# (roughly 6K tokens)
+_QUIZ_CONTENT_CHAR_BUDGET = 24000
+
+
+def _allot_quiz_content_budget(lengths: List[int], budget: int) -> List[int]:
+    """Split the character budget across linked sections of these lengths.
+
+    Each section gets an equal share, and whatever the shorter sections leave
+    unused is shared among the longer ones.
+    """
+    allotments = [0] * len(lengths)
+    remaining = budget
+    by_length = sorted(range(len(lengths)), key=lengths.__getitem__)
+    for position, index in enumerate(by_length):
+        allotments[index] = min(lengths[index], remaining // (len(by_length) - position))
+        remaining -= allotments[index]
+    return allotments
+
+
+def _select_quiz_passages(paragraphs: List[str], ranking: List[int], allotment: int) -> str:
+    """Keep the highest ranked paragraphs that fit the allotment, in their original order."""
+    kept = []
+    used = 0
+    for index in ranking:
+        size = len(paragraphs[index]) + 2
+        if used + size <= allotment:
+            kept.append(index)
+            used += size
+    return "\n\n".join(paragraphs[index] for index in sorted(kept))
+
+
+# One LiteLLMModel per model id, shared by every agent built here
+_model_cache: Dict[str, LiteLLMModel] = {}
+
+
+def _get_model(model_id: str) -> LiteLLMModel:
+    model = _model_cache.get(model_id)
+    if model is None:
+        model = _model_cache.setdefault(
+            model_id,
+            LiteLLMModel(model_id=model_id, api_key=OPENAI_API_KEY)
+        )
+    return model
+
+
+# Prompt templates, filled in with str.format by the handlers below
+
+_QUESTION_GENERATOR_PROMPT_TMPL = """You are an expert quiz question generator. Generate {num_questions} {quiz_type} questions based on the provided content.
+
+For multiple choice questions, follow this format:
+{{
+    "question": "Question text",
+    "options": ["Option 1", "Option 2", "Option 3", "Option 4"],
+    "correct_answer": 0,  # Index of correct option
+    "justification": "Explanation of why this is correct"
+}}
+
+For fill in the blank questions, follow this format:
+{{
+    "question": "Question text with _____ for the blank",
+    "correct_answer": "The correct word or phrase",
+    "justification": "Explanation of why this is correct"
+}}
+
+Ensure questions:
+1. Test understanding, not just memorization
+2. Are clear and unambiguous
+3. Have detailed justifications
+4. For multiple choice: all options are plausible
+5. For fill in blank: blank placement is meaningful"""
+
+_OUTLINE_PROMPT_TMPL = """
+        You are a course outline generator. Your task is to generate a course outline based on the provided information.
+        You must return ONLY a JSON array containing the course sections, with no additional text or explanation.
+        Each section in the array must follow this exact format:
+        {{
+            "order": number (section order),
+            "title": string,
+            "description": string,
+            "type": "content" or "quiz",
+            "duration": number (in minutes),
+            "topics_to_cover": array of strings,
+            "linked_sections": array of numbers (for quiz sections only, references the order numbers of content sections this quiz should test)
+        }}
+        ENSURE that the JSON array is the only output in the response. No other text should be present.
+
+        You may call the `format_course_outline` tool to confirm the output is in the correct format.
+
+        The total duration of all sections must sum to {duration} hours.
+        
+        Outline Creation Guidelines:
+        - The outline must have well placed quizzes to test the students' knowledge after they have learned a new concept.
+        - Each quiz should test knowledge from the 1-2 content sections that precede it.
+        - Each quiz's linked_sections should contain the order numbers of the content sections it is testing.
+        - Each test should not cover more than 2 topics.
+        - The time allocated for each section should be proportional to the complexity and importance of the topic in relation to the provided learning outcomes.
+        
+        Expected Learning Outcomes:
+        {learning_outcomes}
+        
+        Target Audience:
+        {target_audience}
+        
+        Course Duration: {duration} hours
+        """
+
+_SECTION_CONTENT_PROMPT_TMPL = """
+        You are a skilled educational content creator tasked with writing the section "{section_title}" for the course "{course_title}".
+        Your goal is to create **textbook-grade**, comprehensive content that thoroughly teaches the topics to students with no prior knowledge.
+
+        **Target Audience:**
+        {target_audience}
+
+        **Section Details:**
+        - **Title:** {section_title}
+        - **Description:** {section_description}
+        - **Duration:** {section_duration} minutes
+        - **Topics to Cover:**
+        {section_topics}
+        
+        **Procedure to Follow:**
+        1. Design the structure of the section ensuring that each topic is covered and expanded appropriately.
+        2. For each section and subsection, query the Retriever Tool to gather relevant information.
+        3. Fill the content for a section with detailed explanations, examples, and real-world applications.
+        4. Continue with the next section.
+
+        **Instructions:**
+        - **Clarity and Coherence**: Ensure that the content is clear, coherent, and logically structured with a narrative flow.
+        - **Depth and Detail**: Provide in-depth explanations, definitions, and descriptions for each topic. Assume the reader is learning this for the first time. Expand on the topics sufficiently, this is their primary source of learning this topic.
+        - **Educational Approach**: Use clear language, logical progression, and include examples, analogies, and diagrams (described in text) where appropriate to enhance understanding.
+        - **Format**:
+          - Write in **Markdown** format using appropriate headings (`#`, `##`, `###`), lists, code blocks, and emphasis where needed.
+          - Include **tables** or **charts** if they help convey information (describe them in Markdown).
+        - **Use of Provided Materials**: When making queries to the Retriever Tool, ensure that your queries are small and focused to get the most relevant information. Feel free to make multiple queries if needed.
+        - **Length**: The content **must be {word_limit} words long**. The content should be comprehensive enough to cover all topics thoroughly.
+        - **Avoid**:
+          - Do not include any external meta-commentary or instructions.
+          - Do not mention the prompt or that you are an AI language model.
+          - Do not include any other text or explanations in your response other than the content itself.
+
+        Take your time to create high-quality educational content that will engage and educate the students effectively. Make as many queries to the Retriever Tool as needed to gather the necessary information. Take as many steps as needed to complete the task.
+        """
+
+_QUIZ_QUESTIONS_PROMPT_TMPL = """
+            You are an expert quiz question generator for an educational platform. Your task is to create {num_questions} {quiz_type} questions
+            based on the content from the following sections:
+            {section_titles}
+
+            The questions should test the student's understanding of the key concepts covered in these sections.
+            You must return ONLY a JSON array containing the questions, with no additional text or explanation.
+
+            For multiple choice questions, each question in the array must follow this exact format:
+            {{
+                "question": "Clear and specific question text",
+                "options": ["Option 1", "Option 2", "Option 3", "Option 4"],
+                "correct_answer": 0,  # Index of the correct option (0-3)
+                "justification": "Detailed explanation of why this is the correct answer"
+            }}
+
+            For fill in the blank questions, each question must follow this exact format:
+            {{
+                "question": "Question text with _____ where the blank should be",
+                "correct_answer": "The correct word or phrase",
+                "justification": "Detailed explanation of why this is the correct answer"
+            }}
+
+            Question Creation Guidelines:
+            1. Questions should test understanding, not just memorization
+            2. All questions must be clear and unambiguous
+            3. Include detailed justifications that explain the concept
+            4. For multiple choice:
+               - All options should be plausible
+               - Avoid obvious wrong answers
+               - Options should be of similar length
+            5. For fill in blank:
+               - Blank placement should be meaningful
+               - The answer should be specific and unambiguous
+               - Avoid blanks that could have multiple valid answers
+
+            Here is the content to base the questions on:
+
+            {combined_content}
+
+            You MUST return ONLY a JSON array containing the questions, with no additional text or explanation. No need for 'Final answer' or anything like that.
+            """
+
+_CHATBOT_PROMPT_TMPL = """
+            You are a learning assistant for a course. The user will ask you questions about the course content.
+            You must answer the questions based on the course content.
+            You must return your response in Markdown format.
+
+            Course Title: {course_title}
+
+            Section Title: {section_title}
+            Section Description: {section_description}
+            Section Duration: {section_duration} minutes
+            Section Topics: {section_topics}
+            """
+
+_CHATBOT_PROMPT_FOOTER = """
+            Use the retriever tool to find relevant information and help answer the user's questions.
+            Keep your responses educational and engaging.
+            Focus on explaining concepts clearly and providing examples when helpful.
+            If asked about quiz answers, explain the reasoning behind why an answer is correct or incorrect.
+
+            User Input:
+            """
+
+_CHATBOT_FALLBACK_PROMPT = """
+            You are a learning assistant for a course. The user will ask you questions about the course content.
+            Use the retriever tool to find relevant information and help answer the user's questions.
+            Keep your responses educational and engaging.
+
+            User Input:
+            """
+
 
 class FormatCourseOutlineTool(Tool):
     name = "format_course_outline"
@@ -106,19 +355,18 @@ class FormatCourseOutlineTool(Tool):
         Returns:
             list: A list of formatted sections in the specified JSON structure.
         """
-        formatted_sections = []
-        for section in sections:
-            formatted_section = {
+        return [
+            {
                 "order": section.get("order", 0),
                 "title": section.get("title", ""),
                 "description": section.get("description", ""),
-                "type": section.get("type", "content"),
+                "type": (section_type := section.get("type", "content")),
                 "duration": section.get("duration", ""),
                 "topics_to_cover": section.get("topics_to_cover", ""),
-                "linked_sections": section.get("linked_sections", []) if section.get("type") == "quiz" else [],
+                "linked_sections": section.get("linked_sections", []) if section_type == "quiz" else [],
             }
-            formatted_sections.append(formatted_section)
-        return formatted_sections
+            for section in sections
+        ]
 
 
 class QuestionGeneratorTool(Tool):
@@ -145,29 +393,10 @@ class QuestionGeneratorTool(Tool):
     output_type = "array"
 
     def forward(self, quiz_type: str, num_questions: int, content: str) -> list:
-        system_prompt = """You are an expert quiz question generator. Generate {num_questions} {quiz_type} questions based on the provided content.
-
-For multiple choice questions, follow this format:
-{
-    "question": "Question text",
-    "options": ["Option 1", "Option 2", "Option 3", "Option 4"],
-    "correct_answer": 0,  # Index of correct option
-    "justification": "Explanation of why this is correct"
-}
-
-For fill in the blank questions, follow this format:
-{
-    "question": "Question text with _____ for the blank",
-    "correct_answer": "The correct word or phrase",
-    "justification": "Explanation of why this is correct"
-}
-
-Ensure questions:
-1. Test understanding, not just memorization
-2. Are clear and unambiguous
-3. Have detailed justifications
-4. For multiple choice: all options are plausible
-5. For fill in blank: blank placement is meaningful"""
+        system_prompt = _QUESTION_GENERATOR_PROMPT_TMPL.format(
+            num_questions=num_questions,
+            quiz_type=quiz_type
+        )
 
         messages = [
             {"role": "system", "content": system_prompt},
@@ -181,63 +410,32 @@ Ensure questions:
         )
 
         try:
-            return json.loads(response.choices[0].message.content)
-        except json.JSONDecodeError:
+            return orjson.loads(response.choices[0].message.content)
+        except orjson.JSONDecodeError:
             logger.error("Failed to parse AI response as JSON")
             return []
 
 
+@db_handler
 class IntelligenceHandler:
     @staticmethod
     async def generate_outline(course_id: str) -> List[OutlineSection]:
         course = await CourseViewHandler.get_course(course_id)
 
-        learning_outcomes = "\n".join(course.learning_outcomes)
+        learning_outcomes = course.joined_learning_outcomes
         target_audience = course.target_audience
         duration = course.duration
 
         retriever_tool = await IntelligenceHandler.get_docs_retrieval_tool(course_id)
 
-        prompt = f"""
-        You are a course outline generator. Your task is to generate a course outline based on the provided information.
-        You must return ONLY a JSON array containing the course sections, with no additional text or explanation.
-        Each section in the array must follow this exact format:
-        {{
-            "order": number (section order),
-            "title": string,
-            "description": string,
-            "type": "content" or "quiz",
-            "duration": number (in minutes),
-            "topics_to_cover": array of strings,
-            "linked_sections": array of numbers (for quiz sections only, references the order numbers of content sections this quiz should test)
-        }}
-        ENSURE that the JSON array is the only output in the response. No other text should be present.
-
-        You may call the `format_course_outline` tool to confirm the output is in the correct format.
-
-        The total duration of all sections must sum to {duration} hours.
-        
-        Outline Creation Guidelines:
-        - The outline must have well placed quizzes to test the students' knowledge after they have learned a new concept.
-        - Each quiz should test knowledge from the 1-2 content sections that precede it.
-        - Each quiz's linked_sections should contain the order numbers of the content sections it is testing.
-        - Each test should not cover more than 2 topics.
-        - The time allocated for each section should be proportional to the complexity and importance of the topic in relation to the provided learning outcomes.
-        
-        Expected Learning Outcomes:
-        {learning_outcomes}
-        
-        Target Audience:
-        {target_audience}
-        
-        Course Duration: {duration} hours
-        """
-
-        model = LiteLLMModel(
-            model_id="openai/gpt-4o",
-            api_key=OPENAI_API_KEY,
+        prompt = _OUTLINE_PROMPT_TMPL.format(
+            duration=duration,
+            learning_outcomes=learning_outcomes,
+            target_audience=target_audience
         )
 
+        model = _get_model("openai/gpt-4o")
+
         agent = ToolCallingAgent(
             tools=[retriever_tool, FormatCourseOutlineTool()],
             model=model,
@@ -248,13 +446,13 @@ class IntelligenceHandler:
 
         try:
             # Run the agent and get the output
-            agent_output = agent.run(prompt)
+            agent_output = await asyncio.to_thread(agent.run, prompt)
 
             # If the output is a string (JSON), parse it
             if isinstance(agent_output, str):
                 try:
-                    agent_output = json.loads(agent_output)
-                except json.JSONDecodeError as e:
+                    agent_output = orjson.loads(agent_output)
+                except orjson.JSONDecodeError as e:
                     logger.error(f"Error parsing JSON output: {str(e)}")
                     raise ValueError("Invalid JSON output from agent")
 
@@ -262,33 +460,19 @@ class IntelligenceHandler:
             if not isinstance(agent_output, list):
                 raise ValueError("Expected list output from agent")
 
-            # Convert each section to OutlineSection
-            output = []
-            for section in agent_output:
-                # Ensure topics_to_cover is always a list
-                topics = section.get("topics_to_cover", [])
-                if isinstance(topics, str):
-                    topics = [topics]
-
-                # Convert type string to enum
-                section_type = section.get("type", "content")
-                try:
-                    section_type = LessonType(section_type)
-                except ValueError:
-                    section_type = LessonType.CONTENT  # Default to content if invalid
-
-                outline_section = OutlineSection(
+            # Convert each section to OutlineSection, defaulting unknown
+            # types to content and wrapping a single topic string in a list
+            return [
+                OutlineSection(
                     order=int(section.get("order", 0)),
                     title=str(section.get("title", "")),
                     description=str(section.get("description", "")),
-                    type=section_type,
+                    type=_LESSON_TYPES.get(section.get("type", "content"), LessonType.CONTENT),
                     duration=int(section.get("duration", 0)),
-                    topics=topics,
+                    topics=[topics] if isinstance(topics := section.get("topics_to_cover", []), str) else topics,
                 )
-
-                output.append(outline_section)
-
-            return output
+                for section in agent_output
+            ]
 
         except Exception as e:
             logger.error(f"Error in agent execution: {str(e)}")
@@ -306,17 +490,19 @@ class IntelligenceHandler:
 
     @staticmethod
     async def generate_section_content(course_id, section_id, content_id) -> str:
-        course = await Course.get_or_none(id=course_id)
+        course, section, content = await asyncio.gather(
+            Course.get_or_none(id=course_id),
+            OutlineSection.get_or_none(id=section_id),
+            Content.get_or_none(id=content_id),
+        )
         if not course:
             raise ValueError(f"Course with ID {course_id} not found")
 
-        section = await OutlineSection.get_or_none(id=section_id)
         if not section:
             raise ValueError(
                 f"Section with ID {section_id} not found in course {course_id}"
             )
 
-        content = await Content.get_or_none(id=content_id)
         if not content:
             raise ValueError(
                 f"Content with ID {content_id} not found in section {section_id}"
@@ -332,7 +518,7 @@ class IntelligenceHandler:
         section_title = section.title
         section_description = section.description
         section_duration = section.duration
-        section_topics = "\n".join(section.topics)
+        section_topics = section.joined_topics
 
         existing_content = content.markdown if content else ""
 
@@ -344,48 +530,18 @@ class IntelligenceHandler:
         word_limit = section_duration * reading_speed
 
         # Prompt
-        prompt = f"""
-        You are a skilled educational content creator tasked with writing the section "{section_title}" for the course "{course_title}".
-        Your goal is to create **textbook-grade**, comprehensive content that thoroughly teaches the topics to students with no prior knowledge.
-
-        **Target Audience:**
-        {target_audience}
-
-        **Section Details:**
-        - **Title:** {section_title}
-        - **Description:** {section_description}
-        - **Duration:** {section_duration} minutes
-        - **Topics to Cover:**
-        {section_topics}
-        
-        **Procedure to Follow:**
-        1. Design the structure of the section ensuring that each topic is covered and expanded appropriately.
-        2. For each section and subsection, query the Retriever Tool to gather relevant information.
-        3. Fill the content for a section with detailed explanations, examples, and real-world applications.
-        4. Continue with the next section.
-
-        **Instructions:**
-        - **Clarity and Coherence**: Ensure that the content is clear, coherent, and logically structured with a narrative flow.
-        - **Depth and Detail**: Provide in-depth explanations, definitions, and descriptions for each topic. Assume the reader is learning this for the first time. Expand on the topics sufficiently, this is their primary source of learning this topic.
-        - **Educational Approach**: Use clear language, logical progression, and include examples, analogies, and diagrams (described in text) where appropriate to enhance understanding.
-        - **Format**:
-          - Write in **Markdown** format using appropriate headings (`#`, `##`, `###`), lists, code blocks, and emphasis where needed.
-          - Include **tables** or **charts** if they help convey information (describe them in Markdown).
-        - **Use of Provided Materials**: When making queries to the Retriever Tool, ensure that your queries are small and focused to get the most relevant information. Feel free to make multiple queries if needed.
-        - **Length**: The content **must be {word_limit} words long**. The content should be comprehensive enough to cover all topics thoroughly.
-        - **Avoid**:
-          - Do not include any external meta-commentary or instructions.
-          - Do not mention the prompt or that you are an AI language model.
-          - Do not include any other text or explanations in your response other than the content itself.
-
-        Take your time to create high-quality educational content that will engage and educate the students effectively. Make as many queries to the Retriever Tool as needed to gather the necessary information. Take as many steps as needed to complete the task.
-        """
-
-        model = LiteLLMModel(
-            model_id="openai/gpt-4o-2024-08-06",
-            api_key=OPENAI_API_KEY,
+        prompt = _SECTION_CONTENT_PROMPT_TMPL.format(
+            course_title=course_title,
+            target_audience=target_audience,
+            section_title=section_title,
+            section_description=section_description,
+            section_duration=section_duration,
+            section_topics=section_topics,
+            word_limit=word_limit
         )
 
+        model = _get_model("openai/gpt-4o-2024-08-06")
+
         agent = ToolCallingAgent(
             tools=[retriever_tool],
             model=model,
@@ -394,7 +550,7 @@ class IntelligenceHandler:
             planning_interval=2,
         )
 
-        agent_output = agent.run(prompt)
+        agent_output = await asyncio.to_thread(agent.run, prompt)
 
         return agent_output
 
@@ -403,7 +559,7 @@ class IntelligenceHandler:
         """Get a RetrieverTool instance for the given course.
         
         This will either load an existing vector store from disk or create a new one
-        if none exists.
+        if none exists. The tool is cached per course for the life of the process.
         
         Args:
             course_id: The ID of the course to get the retriever for
@@ -411,7 +567,28 @@ class IntelligenceHandler:
         Returns:
             RetrieverTool instance
         """
-        return RetrieverTool.from_course_id(course_id)
+        key = str(course_id)
+        retriever_tool = _retriever_cache.get(key)
+        if retriever_tool is None:
+            retriever_tool = await asyncio.to_thread(_load_retriever, key)
+        return retriever_tool
+
+    @staticmethod
+    def invalidate_retriever(course_id: str) -> None:
+        """Drop the cached retriever for a course so the next use reloads it from disk."""
+        _retriever_cache.pop(str(course_id))
+
+    @staticmethod
+    async def prepare_course_index(course_id: str) -> None:
+        """Build and persist the retrieval index for a course's uploaded documents.
+
+        Run this after uploading documents so that the splitting and embedding
+        happen once, up front, rather than on the first agent request.
+
+        Args:
+            course_id: The ID of the course whose documents changed
+        """
+        await asyncio.to_thread(_rebuild_retriever, str(course_id))
 
     @staticmethod
     async def generate_quiz_questions(
@@ -432,25 +609,37 @@ class IntelligenceHandler:
         Returns:
             List of generated questions in the appropriate format
         """
-        # Get section handler
-        section_handler = SectionViewHandler()
-        
         try:
-            # Get the current section and course
-            course, section = await section_handler.get_section_with_content(course_id, section_id)
+            # Only the current section's links are needed, so skip its content
+            section = await OutlineSection.filter(
+                id=section_id, course_id=course_id
+            ).only("id", "title", "topics", "linked_sections").first()
+            if not section:
+                raise ValueError(f"Section with ID {section_id} not found in course {course_id}")
             
-            # Get content from linked sections
+            # Get content from linked sections: one query for the sections of
+            # this course and one batched query for their content
+            linked_by_id = {
+                linked_section.id: linked_section
+                for linked_section in await OutlineSection.filter(
+                    course_id=course_id, id__in=section.linked_sections
+                ).prefetch_related("content")
+            }
+
             content_texts = []
             section_titles = []
+            missing_sections = []
             for linked_section_id in section.linked_sections:
-                try:
-                    _, linked_section = await section_handler.get_section_with_content(course_id, str(linked_section_id))
-                    if linked_section and linked_section.content:
-                        content_texts.append(linked_section.content.markdown)
-                        section_titles.append(linked_section.title)
-                except ValueError:
-                    logger.warning(f"Could not find linked section {linked_section_id}")
+                linked_section = linked_by_id.get(linked_section_id)
+                if linked_section is None:
+                    missing_sections.append(linked_section_id)
                     continue
+                if linked_section.content:
+                    content_texts.append(linked_section.content.markdown)
+                    section_titles.append(linked_section.title)
+
+            if missing_sections:
+                logger.warning(f"Could not find linked sections {missing_sections}")
             
             if not content_texts:
                 logger.warning("No content found in linked sections")
@@ -459,58 +648,41 @@ class IntelligenceHandler:
             # Get retriever tool for additional context
             retriever = await IntelligenceHandler.get_docs_retrieval_tool(course_id)
             
-            # Combine all content
+            # Combine all content within the prompt budget. Sections that do
+            # not fit their allotment keep the paragraphs most relevant to
+            # this quiz's topics rather than just their opening.
+            allotments = _allot_quiz_content_budget(
+                [len(text) for text in content_texts], _QUIZ_CONTENT_CHAR_BUDGET
+            )
+            relevance_query = "\n".join([section.title, *(section.topics or [])])
+            for i, (text, allotment) in enumerate(zip(content_texts, allotments)):
+                if len(text) <= allotment:
+                    continue
+                paragraphs = [paragraph for paragraph in text.split("\n\n") if paragraph.strip()]
+                try:
+                    ranking = await asyncio.to_thread(retriever.rank_passages, relevance_query, paragraphs)
+                    selected = _select_quiz_passages(paragraphs, ranking, allotment)
+                except Exception as e:
+                    logger.warning(f"Could not rank content of section '{section_titles[i]}': {str(e)}")
+                    selected = ""
+                # Fall back to the opening when no whole paragraph fits
+                content_texts[i] = selected or text[:allotment]
+                logger.warning(
+                    f"Linked section '{section_titles[i]}' trimmed from {len(text)} to "
+                    f"{len(content_texts[i])} characters for quiz generation"
+                )
             combined_content = "\n\n".join(content_texts)
             
             # Create the prompt
-            prompt = f"""
-            You are an expert quiz question generator for an educational platform. Your task is to create {num_questions} {quiz_type} questions
-            based on the content from the following sections:
-            {", ".join(section_titles)}
-
-            The questions should test the student's understanding of the key concepts covered in these sections.
-            You must return ONLY a JSON array containing the questions, with no additional text or explanation.
-
-            For multiple choice questions, each question in the array must follow this exact format:
-            {{
-                "question": "Clear and specific question text",
-                "options": ["Option 1", "Option 2", "Option 3", "Option 4"],
-                "correct_answer": 0,  # Index of the correct option (0-3)
-                "justification": "Detailed explanation of why this is the correct answer"
-            }}
-
-            For fill in the blank questions, each question must follow this exact format:
-            {{
-                "question": "Question text with _____ where the blank should be",
-                "correct_answer": "The correct word or phrase",
-                "justification": "Detailed explanation of why this is the correct answer"
-            }}
-
-            Question Creation Guidelines:
-            1. Questions should test understanding, not just memorization
-            2. All questions must be clear and unambiguous
-            3. Include detailed justifications that explain the concept
-            4. For multiple choice:
-               - All options should be plausible
-               - Avoid obvious wrong answers
-               - Options should be of similar length
-            5. For fill in blank:
-               - Blank placement should be meaningful
-               - The answer should be specific and unambiguous
-               - Avoid blanks that could have multiple valid answers
-
-            Here is the content to base the questions on:
-
-            {combined_content}
-
-            You MUST return ONLY a JSON array containing the questions, with no additional text or explanation. No need for 'Final answer' or anything like that.
-            """
+            prompt = _QUIZ_QUESTIONS_PROMPT_TMPL.format(
+                num_questions=num_questions,
+                quiz_type=quiz_type,
+                section_titles=", ".join(section_titles),
+                combined_content=combined_content
+            )
 
             # Create question generator tool with appropriate model
-            model = LiteLLMModel(
-                model_id="openai/gpt-4o-2024-08-06",
-                api_key=OPENAI_API_KEY,
-            )
+            model = _get_model("openai/gpt-4o-2024-08-06")
 
             agent = ToolCallingAgent(
                 tools=[retriever],
@@ -522,13 +694,14 @@ class IntelligenceHandler:
 
             try:
                 # Run the agent and get the output
-                agent_output = agent.run(prompt)
+                agent_output = await asyncio.to_thread(agent.run, prompt)
 
                 # If the output is a string (JSON), parse it
+                questions = agent_output
                 if isinstance(agent_output, str):
                     try:
-                        questions = json.loads(agent_output)
-                    except json.JSONDecodeError as e:
+                        questions = orjson.loads(agent_output)
+                    except orjson.JSONDecodeError as e:
                         logger.error(f"Error parsing JSON output: {str(e)}")
                         return []
 
@@ -537,18 +710,16 @@ class IntelligenceHandler:
                     logger.error("Expected list output from agent")
                     return []
 
-                # Validate each question
+                # Validate each question with the same rules the quiz editor
+                # applies, dropping any that are malformed
+                question_cls = MultipleChoiceQuestion if quiz_type == "multiple_choice" else FillInBlankQuestion
                 valid_questions = []
                 for q in questions:
-                    if quiz_type == "multiple_choice":
-                        if all(key in q for key in ["question", "options", "correct_answer", "justification"]):
-                            if isinstance(q["options"], list) and len(q["options"]) >= 2:
-                                if 0 <= q["correct_answer"] < len(q["options"]):
-                                    valid_questions.append(q)
-                    else:  # fill_in_the_blank
-                        if all(key in q for key in ["question", "correct_answer", "justification"]):
-                            if "_____" in q["question"]:
-                                valid_questions.append(q)
+                    try:
+                        if question_cls.from_dict(q).validate():
+                            valid_questions.append(q)
+                    except (KeyError, TypeError, AttributeError):
+                        continue
 
                 return valid_questions
 
@@ -574,12 +745,16 @@ class IntelligenceHandler:
         Returns:
             Tuple of (ToolCallingAgent instance configured for chat, system prompt)
         """
+        # Assigned up front so the fallback below can tell what was built
+        retriever_tool = None
         try:
-            course = await Course.get_or_none(id=course_id)
+            course, section = await asyncio.gather(
+                Course.get_or_none(id=course_id),
+                OutlineSection.get_or_none(id=section_id),
+            )
             if not course:
                 raise ValueError(f"Course with ID {course_id} not found")
 
-            section = await OutlineSection.get_or_none(id=section_id)
             if not section:
                 raise ValueError(
                     f"Section with ID {section_id} not found in course {course_id}"
@@ -590,16 +765,13 @@ class IntelligenceHandler:
             section_title = section.title
             section_description = section.description
             section_duration = section.duration
-            section_topics = "\n".join(section.topics) if section.topics else ""
+            section_topics = section.joined_topics
 
             # Get retriever tool
             retriever_tool = await IntelligenceHandler.get_docs_retrieval_tool(course_id)
 
             # Create model
-            model = LiteLLMModel(
-                model_id="openai/gpt-4o",
-                api_key=OPENAI_API_KEY,
-            )
+            model = _get_model("openai/gpt-4o")
             
             # Create chatbot agent
             agent = ToolCallingAgent(
@@ -609,78 +781,110 @@ class IntelligenceHandler:
             )
 
             # Get content from linked sections for quiz sections
-            content_text = ""
+            content_parts = []
             linked_sections_info = []
             
             if section.type == LessonType.QUIZ:
                 # For quiz sections, get content from linked sections
                 if hasattr(section, 'linked_sections') and section.linked_sections:
+                    # Fetch every linked section and its content in two
+                    # batched queries rather than two lookups per section
+                    try:
+                        linked_by_id = {
+                            linked_section.id: linked_section
+                            for linked_section in await OutlineSection.filter(
+                                id__in=section.linked_sections
+                            ).prefetch_related("content")
+                        }
+                    except Exception as e:
+                        logger.error(f"Error getting linked sections {section.linked_sections}: {str(e)}")
+                        linked_by_id = {}
+
+                    # Keep the order in which the quiz lists its sections
                     for linked_id in section.linked_sections:
-                        try:
-                            linked_section = await OutlineSection.get_or_none(id=linked_id)
-                            if linked_section:
-                                linked_sections_info.append(f"- {linked_section.title}")
-                                if linked_section.content_id:
-                                    content = await Content.get_or_none(id=linked_section.content_id)
-                                    if content and content.markdown:
-                                        content_text += f"\n\n### {linked_section.title}\n{content.markdown}"
-                        except Exception as e:
-                            logger.error(f"Error getting linked section {linked_id}: {str(e)}")
+                        linked_section = linked_by_id.get(linked_id)
+                        if not linked_section:
                             continue
+                        linked_sections_info.append(f"- {linked_section.title}")
+                        content = linked_section.content
+                        if content and content.markdown:
+                            content_parts.append(f"\n\n### {linked_section.title}\n{content.markdown}")
             else:
                 # For content sections, get their own content
                 if section.content_id:
                     try:
                         content = await Content.get_or_none(id=section.content_id)
                         if content and content.markdown:
-                            content_text = content.markdown
+                            content_parts.append(content.markdown)
                     except Exception as e:
                         logger.error(f"Error getting content for section {section_id}: {str(e)}")
 
-            # Build the system prompt
-            system_prompt = f"""
-            You are a learning assistant for a course. The user will ask you questions about the course content.
-            You must answer the questions based on the course content.
-            You must return your response in Markdown format.
-
-            Course Title: {course_title}
-
-            Section Title: {section_title}
-            Section Description: {section_description}
-            Section Duration: {section_duration} minutes
-            Section Topics: {section_topics}
-            """
+            # Build the system prompt from its parts in a single join
+            prompt_parts = [
+                _CHATBOT_PROMPT_TMPL.format(
+                    course_title=course_title,
+                    section_title=section_title,
+                    section_description=section_description,
+                    section_duration=section_duration,
+                    section_topics=section_topics
+                )
+            ]
 
             if section.type == LessonType.QUIZ and linked_sections_info:
-                system_prompt += "\nThis quiz covers content from the following sections:\n" + "\n".join(linked_sections_info) + "\n"
-
-            if content_text:
-                system_prompt += f"\nHere is the relevant content:\n{content_text}\n"
+                prompt_parts.append("\nThis quiz covers content from the following sections:\n")
+                prompt_parts.append("\n".join(linked_sections_info))
+                prompt_parts.append("\n")
+
+            if content_parts:
+                prompt_parts.append("\nHere is the relevant content:\n")
+                prompt_parts.extend(content_parts)
+                prompt_parts.append("\n")
             
-            system_prompt += """
-            Use the retriever tool to find relevant information and help answer the user's questions.
-            Keep your responses educational and engaging.
-            Focus on explaining concepts clearly and providing examples when helpful.
-            If asked about quiz answers, explain the reasoning behind why an answer is correct or incorrect.
-
-            User Input:
-            """
+            prompt_parts.append(_CHATBOT_PROMPT_FOOTER)
+            system_prompt = "".join(prompt_parts)
 
             return agent, system_prompt
             
         except Exception as e:
             logger.error(f"Error creating chatbot: {str(e)}")
-            # Create a basic agent with minimal context as fallback
+            # Create a basic agent with minimal context as fallback, without
+            # the retriever if loading it is what failed
             agent = ToolCallingAgent(
-                tools=[retriever_tool],
-                model=model,
+                tools=[retriever_tool] if retriever_tool is not None else [],
+                model=_get_model("openai/gpt-4o"),
                 max_steps=3
             )
-            basic_prompt = f"""
-            You are a learning assistant for a course. The user will ask you questions about the course content.
-            Use the retriever tool to find relevant information and help answer the user's questions.
-            Keep your responses educational and engaging.
-
-            User Input:
-            """
+            basic_prompt = _CHATBOT_FALLBACK_PROMPT
             return agent, basic_prompt
+
+    @staticmethod
+    def run_chat_agent(
+        agent: ToolCallingAgent,
+        prompt: str,
+        on_step: Optional[Callable[[int], None]] = None
+    ) -> str:
+        """Run a chatbot agent step by step and return its final answer.
+
+        The agent only produces its answer through a final tool call, so the
+        reply itself cannot be streamed; on_step is called with each step
+        number as it finishes so the caller can show progress meanwhile.
+
+        Args:
+            agent: The agent from get_course_chatbot
+            prompt: The full prompt for this turn
+            on_step: Optional callback taking the finished step's number
+
+        Returns:
+            The agent's final answer as a string
+        """
+        answer = None
+        for step in agent.run(prompt, stream=True):
+            if isinstance(step, ActionStep):
+                if on_step is not None:
+                    on_step(step.step_number)
+            else:
+                answer = step
+        # Newer smolagents releases wrap the answer in a final answer step
+        for attr in ("output", "final_answer"):
+            answer = getattr(answer, attr, answer)
+        return str(answer)
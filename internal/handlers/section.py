@@ -1,10 +1,15 @@
 import logging
-from typing import Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
-from internal.repository.course import Course, OutlineSection, Content, LessonType
+from tortoise import timezone
+
+from internal.repository.course import Course, OutlineSection, Content, LessonType, Quiz
+from internal.handlers.course import CourseViewHandler
+from internal.utils.db import db_handler
 
 logger = logging.getLogger(__name__)
 
+@db_handler
 class SectionViewHandler:
     @staticmethod
     async def get_section_with_content(course_id: str, section_id: str) -> Tuple[Course, OutlineSection]:
@@ -15,21 +20,21 @@ class SectionViewHandler:
             section_id: The ID of the section
             
         Returns:
-            Tuple[Course, OutlineSection]: The course and section objects
+            Tuple[Course, OutlineSection]: The course and section objects. Both
+                come from the shared course cache; call
+                CourseViewHandler.invalidate_course after saving changes to them.
             
         Raises:
             ValueError: If course or section is not found
         """
-        course = await Course.get_or_none(id=course_id)
-        if not course:
-            raise ValueError(f"Course with ID {course_id} not found")
-            
-        await course.fetch_related('outline_sections')
+        # Served from the cached course, which already holds every section
+        # with its content and quiz, so editor reruns need no queries
+        course = await CourseViewHandler.get_course(course_id)
+        section_id = str(section_id)
         section = next((s for s in course.outline_sections if str(s.id) == section_id), None)
         if not section:
             raise ValueError(f"Section with ID {section_id} not found in course {course_id}")
             
-        await section.fetch_related('content')
         return course, section
 
     @staticmethod
@@ -42,8 +47,10 @@ class SectionViewHandler:
         Returns:
             Content: The section's content object
         """
-        section = await OutlineSection.get_or_none(id=section_id)
-        await section.fetch_related('content')
+        # Join the one-to-one content into the section query
+        section = await OutlineSection.get_or_none(id=section_id).select_related('content')
+        if section is None:
+            raise ValueError(f"Section with ID {section_id} not found")
 
         if section.content is None:
             try:
@@ -52,7 +59,8 @@ class SectionViewHandler:
                     markdown="# New Section\nStart writing your content here..."
                 )
                 section.content = content
-                await section.save()
+                await section.save(update_fields=["content_id", "updated_at"])
+                CourseViewHandler.invalidate_course(section.course_id)
 
                 return section.content
             except Exception as e:
@@ -72,25 +80,68 @@ class SectionViewHandler:
         Raises:
             ValueError: If there's an error updating the content
         """
-        section = await OutlineSection.get_or_none(id=section_id)
+        section = await OutlineSection.get_or_none(id=section_id).select_related('content')
         if section is None:
             raise ValueError(f"Section with ID {section_id} not found")
 
         try:
-            await section.fetch_related('content')
             if section.content is None:
                 # If no content exists, create it
                 content = await Content.create(
                     markdown=markdown_content
                 )
                 section.content = content
-                await section.save()
+                await section.save(update_fields=["content_id", "updated_at"])
                 logger.info(f"Created new content for section {section.id}")
             else:
                 # Update existing content
                 section.content.markdown = markdown_content
-                await section.content.save()
+                await section.content.save(update_fields=["markdown", "updated_at"])
                 logger.info(f"Updated content for section {section.id}")
+            CourseViewHandler.invalidate_course(section.course_id)
         except Exception as e:
             logger.error(f"Error updating content for section {section.id}: {str(e)}")
-            raise ValueError(f"Failed to update section content: {str(e)}") 
\ No newline at end of file
+            raise ValueError(f"Failed to update section content: {str(e)}") 
+
+    @staticmethod
+    async def update_linked_sections(section: OutlineSection, linked_sections: List[int]) -> None:
+        """Set the content sections a quiz section tests knowledge from.
+
+        Args:
+            section: The quiz section, possibly the shared cached instance
+            linked_sections: IDs of the linked content sections
+        """
+        try:
+            await OutlineSection.filter(id=section.id).update(
+                linked_sections=linked_sections,
+                updated_at=timezone.now()
+            )
+        finally:
+            CourseViewHandler.invalidate_course(section.course_id)
+
+    @staticmethod
+    async def save_section_quiz(section: OutlineSection, quiz_type: str, questions: List[Dict[str, Any]]) -> None:
+        """Update a section's quiz, creating and linking it if it has none.
+
+        Args:
+            section: The quiz section, possibly the shared cached instance
+            quiz_type: The quiz type value
+            questions: The questions in their stored format
+        """
+        try:
+            updated = 0
+            if section.quiz_id is not None:
+                updated = await Quiz.filter(id=section.quiz_id).update(
+                    type=quiz_type,
+                    questions=questions,
+                    updated_at=timezone.now()
+                )
+            if not updated:
+                # No quiz yet, or the linked one no longer exists
+                quiz = await Quiz.create(type=quiz_type, questions=questions)
+                await OutlineSection.filter(id=section.id).update(
+                    quiz_id=quiz.id,
+                    updated_at=timezone.now()
+                )
+        finally:
+            CourseViewHandler.invalidate_course(section.course_id)
@@ -1,4 +1,4 @@
-from datetime import datetime
+import asyncio
 from typing import Dict, List, Optional, Tuple
 
 from internal.repository.student_progress import (
@@ -7,7 +7,9 @@ from internal.repository.student_progress import (
     QuizAttempt,
     SectionStatus
 )
+from internal.utils.db import db_handler
 
+@db_handler
 class StudentProgressHandler:
     @staticmethod
     async def get_course_progress(course_id: str) -> StudentCourseTracker:
@@ -19,17 +21,15 @@ class StudentProgressHandler:
         course_id: str,
         section_id: str,
         is_quiz: bool = False,
-        quiz_data: Optional[Dict] = None
+        quiz_data: Optional[Dict] = None,
+        complete_course: bool = False
     ) -> None:
-        """Mark a section as complete and handle quiz data if present"""
-        progress = await StudentProgressRepository.get_or_create_progress(course_id)
-        
-        # Update section status
-        await StudentProgressRepository.update_section_status(
-            progress,
-            section_id,
-            SectionStatus.COMPLETED
-        )
+        """Mark a section as complete and handle quiz data if present.
+
+        Pass complete_course for the final section to also mark the course
+        completed in the same transaction.
+        """
+        attempt = None
         
         # Handle quiz data if this is a quiz section
         if is_quiz and quiz_data:
@@ -40,13 +40,14 @@ class StudentProgressHandler:
             attempt = QuizAttempt(
                 quiz_id=str(quiz_data["quiz_id"]),  # Ensure string
                 score=float(quiz_data["score"]),    # Ensure float
-                completed_at=datetime.utcnow(),
                 answers=quiz_data["answers"],
                 incorrect_questions=quiz_data["incorrect_questions"]
             )
-            
-            # Add the attempt to the progress tracker
-            await StudentProgressRepository.add_quiz_attempt(progress, section_id, attempt)
+        
+        progress = await StudentProgressRepository.get_or_create_progress(course_id)
+        
+        # Update the section status, attempt and course completion atomically
+        await StudentProgressRepository.complete_section(progress, section_id, attempt, complete_course)
     
     @staticmethod
     async def start_section(
@@ -57,15 +58,8 @@ class StudentProgressHandler:
         """Mark a section as in progress"""
         progress = await StudentProgressRepository.get_or_create_progress(course_id)
         
-        # Update section status
-        await StudentProgressRepository.update_section_status(
-            progress,
-            section_id,
-            SectionStatus.IN_PROGRESS
-        )
-        
-        # Update current section
-        await StudentProgressRepository.update_current_section(progress, section_index)
+        # Update section status and current section with one save
+        await StudentProgressRepository.start_section(progress, section_id, section_index)
     
     @staticmethod
     async def get_quiz_history(
@@ -76,6 +70,12 @@ class StudentProgressHandler:
         progress = await StudentProgressRepository.get_or_create_progress(course_id)
         return await StudentProgressRepository.get_quiz_attempts(progress, section_id)
     
+    @staticmethod
+    async def get_quiz_histories(course_id: str) -> Dict[str, List[QuizAttempt]]:
+        """Get the quiz attempts of every attempted section, keyed by section ID"""
+        progress = await StudentProgressRepository.get_or_create_progress(course_id)
+        return await StudentProgressRepository.get_quiz_attempts_by_section(progress)
+    
     @staticmethod
     async def mark_course_completed(course_id: str) -> None:
         """Mark the entire course as completed"""
@@ -89,10 +89,19 @@ class StudentProgressHandler:
     ) -> Tuple[SectionStatus, List[QuizAttempt]]:
         """Get section status and quiz attempts if any"""
         progress = await StudentProgressRepository.get_or_create_progress(course_id)
-        status = await StudentProgressRepository.get_section_status(progress, section_id)
-        attempts = await StudentProgressRepository.get_quiz_attempts(progress, section_id)
+        # Both are independent SELECTs, so run them concurrently
+        status, attempts = await asyncio.gather(
+            StudentProgressRepository.get_section_status(progress, section_id),
+            StudentProgressRepository.get_quiz_attempts(progress, section_id)
+        )
         return status, attempts
     
+    @staticmethod
+    async def get_section_statuses(course_id: str) -> Dict[str, SectionStatus]:
+        """Get the status of every started or completed section, keyed by section ID"""
+        progress = await StudentProgressRepository.get_or_create_progress(course_id)
+        return await StudentProgressRepository.get_section_statuses(progress)
+    
     @staticmethod
     async def get_current_section(course_id: str) -> int:
         """Get the current section index"""
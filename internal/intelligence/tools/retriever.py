@@ -1,17 +1,27 @@
-from openai import api_key
 from smolagents import Tool
-from typing import List, Optional
+from typing import Dict, List, Optional, TYPE_CHECKING
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+import asyncio
 import os
-from pathlib import Path
 import pickle
-from langchain.docstore.document import Document
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+from langchain_core.documents import Document
 from internal.utils.storage import StorageHandler
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from internal.utils.cache import LRUCache
 import logging
 from dotenv import load_dotenv
 
+# faiss, the FAISS vector store, OpenAI embeddings and the text splitter pull
+# in large dependency trees, so they are imported where first used instead
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+    from langchain_openai import OpenAIEmbeddings
+
 logger = logging.getLogger(__name__)
 
 # Load environment variables
@@ -22,6 +32,96 @@ OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 if not OPENAI_API_KEY:
     raise ValueError("OPENAI_API_KEY environment variable is not set")
 
+# Below this many chunks an exact flat scan is already fast; above it the
+# index is built as HNSW for sub-linear search, with vectors stored as 8-bit
+# scalar-quantized codes to cut their memory four-fold
+HNSW_MIN_VECTORS = 5000
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+
+# Query embeddings keyed by query text. Every course uses the same embedding
+# model, so agents repeating a query skip the OpenAI round-trip.
+_query_embedding_cache = LRUCache(maxsize=1024)
+
+# Common PDF artifacts stripped from document text in one pass. Longer
+# alternatives come first so "endstream" is not consumed as "stream".
+_PDF_ARTIFACTS = [
+    "endstream", "endobj", "stream", "obj",
+    r"\(", r"\)", r"\[", r"\]",
+    "xref", "trailer", "startxref"
+]
+_PDF_ARTIFACT_RE = re.compile(
+    "|".join(map(re.escape, sorted(_PDF_ARTIFACTS, key=len, reverse=True)))
+)
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIMENSIONS = 1536
+# Chunks sent per embeddings request, and how many requests may be in flight
+# at once. 512 chunks of ~1000 characters stay well inside the per-request
+# token limit.
+EMBEDDING_BATCH_SIZE = 512
+EMBEDDING_CONCURRENCY = 4
+
+
+@lru_cache(maxsize=4)
+def _get_embeddings(model: str = EMBEDDING_MODEL, dimensions: int = EMBEDDING_DIMENSIONS) -> "OpenAIEmbeddings":
+    """Shared embeddings client, so its HTTP session and tokenizer are set up once."""
+    from langchain_openai import OpenAIEmbeddings
+
+    return OpenAIEmbeddings(
+        model=model,
+        dimensions=dimensions,
+        chunk_size=EMBEDDING_BATCH_SIZE,
+        max_retries=2,
+        api_key=OPENAI_API_KEY
+    )
+
+
+def _embed_documents(embeddings: "OpenAIEmbeddings", texts: List[str]) -> List[List[float]]:
+    """Embed texts in batches, with up to EMBEDDING_CONCURRENCY requests in flight."""
+    batches = [texts[i:i + EMBEDDING_BATCH_SIZE] for i in range(0, len(texts), EMBEDDING_BATCH_SIZE)]
+    if len(batches) <= 1:
+        return embeddings.embed_documents(texts)
+
+    with ThreadPoolExecutor(max_workers=EMBEDDING_CONCURRENCY) as pool:
+        return [vector for batch in pool.map(embeddings.embed_documents, batches) for vector in batch]
+
+
+def _build_vector_store(docs: List[Document], embeddings: "OpenAIEmbeddings") -> "FAISS":
+    """Embed documents into a FAISS store, using a quantized HNSW index for large corpora."""
+    import faiss
+    import numpy as np
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+
+    # One contiguous float32 matrix, the layout FAISS's kernels read directly
+    vectors = np.ascontiguousarray(
+        _embed_documents(embeddings, [doc.page_content for doc in docs]),
+        dtype=np.float32
+    )
+    dimensions = vectors.shape[1]
+
+    if len(docs) >= HNSW_MIN_VECTORS:
+        index = faiss.IndexHNSWSQ(dimensions, faiss.ScalarQuantizer.QT_8bit, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        # Learns the per-dimension value ranges used for quantization
+        index.train(vectors)
+        logger.info(f"Building quantized HNSW index over {len(docs)} chunks")
+    else:
+        index = faiss.IndexFlatL2(dimensions)
+    index.add(vectors)
+
+    doc_ids = [str(uuid.uuid4()) for _ in docs]
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=InMemoryDocstore(dict(zip(doc_ids, docs))),
+        index_to_docstore_id=dict(enumerate(doc_ids)),
+    )
+
+
 class RetrieverTool(Tool):
     name = "retriever"
     description = """
@@ -37,7 +137,7 @@ class RetrieverTool(Tool):
     output_type = "string"
 
     @classmethod
-    def from_course_id(cls, course_id: str) -> 'RetrieverTool':
+    async def from_course_id(cls, course_id: str) -> 'RetrieverTool':
         """Create a RetrieverTool instance from a course ID.
         
         Args:
@@ -46,55 +146,38 @@ class RetrieverTool(Tool):
         Returns:
             RetrieverTool instance
         """
-        storage = StorageHandler()
-        
         # Try to load existing vector store first
         instance = cls(docs=[], course_id=course_id)
-        vector_store = instance._load_vector_store(course_id)
+        vector_store = await asyncio.to_thread(instance._load_vector_store, course_id)
         if vector_store:
             instance.vector_store = vector_store
             instance.k = 5
             instance.score_threshold = 0.7
             return instance
-            
-        # If no vector store exists, process the documents
-        file_paths = storage.list_files(course_id)
-        source_docs = []
-        
-        for file_path in file_paths:
-            try:
-                # First try UTF-8
-                try:
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        content = f.read()
-                except UnicodeDecodeError:
-                    # If UTF-8 fails, try with latin-1
-                    with open(file_path, "r", encoding="latin-1") as f:
-                        content = f.read()
-
-                # Skip empty content
-                if not content.strip():
-                    logger.info(f"Skipping empty file: {file_path}")
-                    continue
 
-                # Create document with metadata
-                doc = Document(
-                    page_content=content,
-                    metadata={
-                        "source": os.path.basename(file_path),
-                        "file_path": file_path,
-                    },
-                )
-                source_docs.append(doc)
-                logger.info(f"Successfully processed file: {file_path}")
-            except Exception as e:
-                logger.error(f"Error reading file {file_path}: {str(e)}")
-                continue
+        return await cls.prepare_course_index(course_id)
+
+    @classmethod
+    async def prepare_course_index(cls, course_id: str) -> 'RetrieverTool':
+        """Split and embed a course's uploaded documents and persist the index.
 
+        Called when documents are uploaded so that later retrievals only have
+        to load the saved vector store. File reads, splitting and embedding
+        run in worker threads so the event loop is not blocked.
+
+        Args:
+            course_id: The ID of the course to index
+
+        Returns:
+            RetrieverTool instance backed by the freshly built index
+        """
+        source_docs = await cls._load_course_documents(course_id)
         if not source_docs:
             logger.warning("No documents were successfully processed")
             return cls(docs=[], course_id=course_id)
 
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
         # Split documents
         text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
@@ -104,8 +187,49 @@ class RetrieverTool(Tool):
             separators=["\n\n", "\n", ".", " ", ""],
         )
 
-        docs_processed = text_splitter.split_documents(source_docs)
-        return cls(docs=docs_processed, course_id=course_id)
+        docs_processed = await asyncio.to_thread(text_splitter.split_documents, source_docs)
+        return await asyncio.to_thread(cls, docs=docs_processed, course_id=course_id)
+
+    @staticmethod
+    async def _load_course_documents(course_id: str) -> List[Document]:
+        """Read every uploaded file of a course into a Document, concurrently."""
+        storage = StorageHandler()
+        file_paths = storage.list_files(course_id)
+        docs = await asyncio.gather(*(
+            asyncio.to_thread(RetrieverTool._read_file, file_path) for file_path in file_paths
+        ))
+        return [doc for doc in docs if doc is not None]
+
+    @staticmethod
+    def _read_file(file_path: str) -> Optional[Document]:
+        """Read one uploaded file into a Document, or None if it is empty or unreadable."""
+        try:
+            # First try UTF-8
+            try:
+                with open(file_path, "r", encoding="utf-8") as f:
+                    content = f.read()
+            except UnicodeDecodeError:
+                # If UTF-8 fails, try with latin-1
+                with open(file_path, "r", encoding="latin-1") as f:
+                    content = f.read()
+
+            # Skip empty content
+            if not content.strip():
+                logger.info(f"Skipping empty file: {file_path}")
+                return None
+
+            logger.info(f"Successfully processed file: {file_path}")
+            # Create document with metadata
+            return Document(
+                page_content=content,
+                metadata={
+                    "source": os.path.basename(file_path),
+                    "file_path": file_path,
+                },
+            )
+        except Exception as e:
+            logger.error(f"Error reading file {file_path}: {str(e)}")
+            return None
 
     def __init__(self, docs: List[Document], course_id: Optional[str] = None, **kwargs):
         super().__init__(**kwargs)
@@ -119,6 +243,11 @@ class RetrieverTool(Tool):
             self.vector_store = None
             self.k = 5  # Number of results to return
             self.score_threshold = 0.7  # Minimum similarity score threshold
+            # Formatted results for queries already answered by this course's index
+            self._results = LRUCache(maxsize=128)
+            # Searches currently running, so concurrent identical queries share one
+            self._inflight: Dict[str, Future] = {}
+            self._inflight_lock = threading.Lock()
             
             # Filter out non-text documents and empty documents
             valid_docs = []
@@ -133,19 +262,9 @@ class RetrieverTool(Tool):
             if not valid_docs and not course_id:
                 raise ValueError("No valid text content found in documents")
                 
-            # Initialize OpenAI embeddings
-            embeddings = OpenAIEmbeddings(
-                model="text-embedding-3-small",  # Using the latest embedding model
-                dimensions=1536,  # Optimal dimension for text-embedding-3-small
-                api_key=OPENAI_API_KEY
-            )
-            
             # Create FAISS vector store from documents if we have valid docs
             if valid_docs:
-                self.vector_store = FAISS.from_documents(
-                    valid_docs,
-                    embeddings,
-                )
+                self.vector_store = _build_vector_store(valid_docs, _get_embeddings())
                 
                 # Save vector store if course_id is provided
                 if course_id:
@@ -160,28 +279,53 @@ class RetrieverTool(Tool):
         return os.path.join(course_dir, "vector_store.faiss")
 
     def _save_vector_store(self, course_id: str) -> None:
-        """Save the FAISS vector store to disk."""
+        """Save the FAISS vector store to disk.
+
+        Writes the same index.faiss/index.pkl pair as FAISS.save_local, so
+        FAISS.load_local still reads it, but into a temporary directory that
+        is then swapped into place. A crash mid-save leaves the previous
+        store, or none, rather than a torn pair.
+        """
+        import faiss
+
         try:
             vector_store_path = self._get_vector_store_path(course_id)
-            self.vector_store.save_local(vector_store_path)
+            tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(vector_store_path), prefix=".vector_store-")
+            try:
+                faiss.write_index(self.vector_store.index, os.path.join(tmp_dir, "index.faiss"))
+                with open(os.path.join(tmp_dir, "index.pkl"), "wb") as f:
+                    pickle.dump(
+                        (self.vector_store.docstore, self.vector_store.index_to_docstore_id),
+                        f,
+                        protocol=pickle.HIGHEST_PROTOCOL
+                    )
+
+                # Directories cannot be replaced over, so move the old one aside first
+                previous_path = None
+                if os.path.exists(vector_store_path):
+                    previous_path = f"{vector_store_path}.old"
+                    shutil.rmtree(previous_path, ignore_errors=True)
+                    os.replace(vector_store_path, previous_path)
+                os.replace(tmp_dir, vector_store_path)
+                if previous_path:
+                    shutil.rmtree(previous_path, ignore_errors=True)
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
         except Exception as e:
-            print(f"Warning: Failed to save vector store: {str(e)}")
+            logger.error(f"Warning: Failed to save vector store: {str(e)}")
 
-    def _load_vector_store(self, course_id: str) -> FAISS | None:
+    def _load_vector_store(self, course_id: str) -> Optional["FAISS"]:
         """Load the FAISS vector store from disk if it exists."""
+        from langchain_community.vectorstores import FAISS
+
         try:
             vector_store_path = self._get_vector_store_path(course_id)
             if os.path.exists(vector_store_path):
-                embeddings = OpenAIEmbeddings(
-                    model="text-embedding-3-small",
-                    dimensions=1536,
-                    api_key=OPENAI_API_KEY
-                )
                 # Since we're loading from our own saved files in a controlled environment,
                 # it's safe to allow deserialization
                 return FAISS.load_local(
                     vector_store_path,
-                    embeddings,
+                    _get_embeddings(),
                     allow_dangerous_deserialization=True
                 )
         except Exception as e:
@@ -201,20 +345,42 @@ class RetrieverTool(Tool):
             return ""
             
         # Remove common PDF artifacts
-        artifacts = [
-            "endstream", "endobj", "stream", "obj",
-            r"\(", r"\)", r"\[", r"\]",
-            "xref", "trailer", "startxref"
-        ]
-        
-        cleaned = text
-        for artifact in artifacts:
-            cleaned = cleaned.replace(artifact, "")
+        cleaned = _PDF_ARTIFACT_RE.sub("", text)
             
-        # Normalize whitespace
-        cleaned = " ".join(cleaned.split())
-        
-        return cleaned.strip()
+        # Normalize whitespace; split() already drops leading and trailing runs
+        return " ".join(cleaned.split())
+
+    def _embed_query(self, query: str) -> List[float]:
+        """Embed a search query, reusing the embedding for repeated queries."""
+        embedding = _query_embedding_cache.get(query)
+        if embedding is None:
+            embedding = self.vector_store.embeddings.embed_query(query)
+            _query_embedding_cache.set(query, embedding)
+        return embedding
+
+    def rank_passages(self, query: str, passages: List[str]) -> List[int]:
+        """Order passage indices from most to least relevant to the query.
+
+        Args:
+            query: Text describing what the passages should cover
+            passages: Passages to rank; they need not be in the index
+
+        Returns:
+            Indices into passages, most relevant first
+        """
+        import numpy as np
+
+        embeddings = _get_embeddings()
+        query_vector = _query_embedding_cache.get(query)
+        if query_vector is None:
+            query_vector = embeddings.embed_query(query)
+            _query_embedding_cache.set(query, query_vector)
+        vectors = np.asarray(_embed_documents(embeddings, passages), dtype=np.float32)
+
+        # OpenAI embeddings have unit length, so the dot product is the
+        # cosine similarity
+        scores = vectors @ np.asarray(query_vector, dtype=np.float32)
+        return np.argsort(-scores, kind="stable").tolist()
 
     def forward(self, query: str) -> str:
         """
@@ -232,10 +398,37 @@ class RetrieverTool(Tool):
         if not self.vector_store:
             return "No document content available for searching. Please ensure documents have been properly loaded."
 
+        cached = self._results.get(query)
+        if cached is not None:
+            return cached
+
+        # Retrievers are shared across sessions, each calling from its own
+        # thread; the first caller searches and the rest wait on its future
+        with self._inflight_lock:
+            future = self._inflight.get(query)
+            is_owner = future is None
+            if is_owner:
+                future = self._inflight[query] = Future()
+        if not is_owner:
+            return future.result()
+
+        try:
+            result = self._search(query)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(query, None)
+
+    def _search(self, query: str) -> str:
+        """Embed the query, search the index and format the matches."""
         try:
             # Perform similarity search with scores
-            docs_and_scores = self.vector_store.similarity_search_with_score(
-                query,
+            docs_and_scores = self.vector_store.similarity_search_with_score_by_vector(
+                self._embed_query(query),
                 k=self.k
             )
             
@@ -261,7 +454,9 @@ class RetrieverTool(Tool):
             if not result_parts:
                 return "No sufficiently relevant content found in the retrieved documents."
                 
-            return "\nRelevant course materials:\n" + "\n".join(result_parts)
+            result = "\nRelevant course materials:\n" + "\n".join(result_parts)
+            self._results.set(query, result)
+            return result
             
         except Exception as e:
             logger.error(f"Error during retrieval: {str(e)}")
@@ -1,4 +1,5 @@
 from enum import Enum
+from functools import cached_property
 
 from tortoise import fields
 from tortoise.models import Model
@@ -16,12 +17,22 @@ class Course(Model):
     target_audience = fields.TextField(null=True)
     duration = fields.FloatField(description="Course duration in hours", null=True)
 
+    @cached_property
+    def joined_learning_outcomes(self) -> str:
+        """Learning outcomes as a single newline-separated string, for prompts."""
+        return "\n".join(self.learning_outcomes or [])
+
 
 class LessonType(Enum):
     CONTENT = "content"
     QUIZ = "quiz"
 
 
+# Lesson type choices in widget order, with each member's position in them
+LESSON_TYPES = list(LessonType)
+LESSON_TYPE_INDEX = {lesson_type: i for i, lesson_type in enumerate(LESSON_TYPES)}
+
+
 class OutlineSection(Model):
     id = fields.IntField(pk=True)
     created_at = fields.DatetimeField(auto_now_add=True)
@@ -41,6 +52,11 @@ class OutlineSection(Model):
 
     linked_sections = fields.JSONField(default=[]) 
 
+    @cached_property
+    def joined_topics(self) -> str:
+        """Topics as a single newline-separated string, for prompts."""
+        return "\n".join(self.topics or [])
+
 
     class Meta:
         table = "outline_sections"
@@ -1,6 +1,9 @@
-from typing import Dict, List, Optional
+from contextvars import ContextVar
 from datetime import datetime
-from tortoise import fields, models
+from typing import Dict, List, Optional
+import uuid
+from tortoise import connections, fields, models, timezone
+from tortoise.transactions import in_transaction
 from enum import Enum
 
 class SectionStatus(str, Enum):
@@ -11,69 +14,134 @@ class SectionStatus(str, Enum):
 class StudentCourseTracker(models.Model):
     """Tracks a student's progress in a course"""
     id = fields.UUIDField(pk=True)
-    course_id = fields.IntField()
+    course_id = fields.IntField(unique=True)
     last_accessed = fields.DatetimeField(auto_now=True)
     current_section_index = fields.IntField(default=0)
     completed = fields.BooleanField(default=False)
     completed_at = fields.DatetimeField(null=True)
     
-    # Store section completion status
-    section_status = fields.JSONField(default=dict)  # Dict[str, SectionStatus]
-    
-    # Store quiz attempts and results
-    quiz_results = fields.JSONField(default=dict)  # Dict[str, List[QuizAttempt]]
+    # Legacy JSON columns, superseded by SectionProgress and QuizAttempt rows.
+    # Kept so trackers can still be inserted into databases created before them;
+    # anything left in them is moved into rows when the tracker is next loaded.
+    section_status = fields.JSONField(default=dict)
+    quiz_results = fields.JSONField(default=dict)
     
     class Meta:
         table = "student_course_tracker"
 
-class QuizAttempt:
+class SectionProgress(models.Model):
+    """Status of one section within a tracker"""
+    id = fields.IntField(pk=True)
+    tracker: fields.ForeignKeyRelation[StudentCourseTracker] = fields.ForeignKeyField(
+        "models.StudentCourseTracker", related_name="sections", on_delete=fields.CASCADE
+    )
+    section_id = fields.CharField(max_length=32)
+    status = fields.CharEnumField(SectionStatus, default=SectionStatus.NOT_STARTED)
+    
+    class Meta:
+        table = "section_progress"
+        unique_together = (("tracker", "section_id"),)
+
+class QuizAttempt(models.Model):
     """Represents a single quiz attempt"""
-    def __init__(
-        self,
-        quiz_id: str,
-        score: float,
-        completed_at: datetime,
-        answers: Dict[str, str],  # question_index -> answer
-        incorrect_questions: List[int]  # list of question indices that were wrong
-    ):
-        self.quiz_id = quiz_id
-        self.score = score
-        self.completed_at = completed_at
-        self.answers = answers
-        self.incorrect_questions = incorrect_questions
-        
-    def to_dict(self) -> dict:
-        return {
-            "quiz_id": self.quiz_id,
-            "score": self.score,
-            "completed_at": self.completed_at.isoformat(),
-            "answers": self.answers,
-            "incorrect_questions": self.incorrect_questions
-        }
+    id = fields.IntField(pk=True)
+    tracker: fields.ForeignKeyRelation[StudentCourseTracker] = fields.ForeignKeyField(
+        "models.StudentCourseTracker", related_name="quiz_attempts", on_delete=fields.CASCADE
+    )
+    section_id = fields.CharField(max_length=32)
+    quiz_id = fields.CharField(max_length=32)
+    score = fields.FloatField()
+    completed_at = fields.DatetimeField(auto_now_add=True)
+    answers = fields.JSONField()  # question_index -> answer
+    incorrect_questions = fields.JSONField()  # list of question indices that were wrong
     
-    @classmethod
-    def from_dict(cls, data: dict) -> 'QuizAttempt':
-        return cls(
-            quiz_id=data["quiz_id"],
-            score=data["score"],
-            completed_at=datetime.fromisoformat(data["completed_at"]),
-            answers=data["answers"],
-            incorrect_questions=data["incorrect_questions"]
-        )
+    class Meta:
+        table = "quiz_attempt"
+        indexes = (("tracker", "section_id"),)
+
+# Fetch-or-insert the tracker in one round trip; relies on the unique course_id
+_UPSERT_TRACKER_SQL = (
+    "INSERT INTO student_course_tracker "
+    "(id, course_id, current_section_index, completed, section_status, quiz_results, last_accessed) "
+    "VALUES ($1, $2, 0, false, '{}', '{}', now()) "
+    "ON CONFLICT (course_id) DO UPDATE SET last_accessed = now() "
+    "RETURNING *"
+)
+
+
+# Trackers already loaded during the current script run, keyed by course ID.
+# main() sets a fresh dict at the start of each run; calls handed to the
+# database loop run with a copy of the caller's context, so they all share
+# that one dict. Outside a run nothing is cached.
+_progress_cache: ContextVar[Optional[Dict[int, StudentCourseTracker]]] = ContextVar("progress_cache", default=None)
+
+
+def reset_progress_cache() -> None:
+    """Start an empty tracker cache for the current script run."""
+    _progress_cache.set({})
+
 
 class StudentProgressRepository:
     @staticmethod
     async def get_or_create_progress(course_id: int) -> StudentCourseTracker:
         """Get or create a progress tracker for the course"""
-        progress, _ = await StudentCourseTracker.get_or_create(
-            course_id=course_id,
-            defaults={
-                "section_status": {},
-                "quiz_results": {}
-            }
-        )
+        cache = _progress_cache.get()
+        course_id = int(course_id)
+        if cache is not None and course_id in cache:
+            return cache[course_id]
+
+        connection = connections.get("default")
+        if connection.capabilities.dialect == "postgres":
+            rows = await connection.execute_query_dict(_UPSERT_TRACKER_SQL, [uuid.uuid4(), course_id])
+            progress = StudentCourseTracker._init_from_db(**rows[0])
+        else:
+            progress, _ = await StudentCourseTracker.get_or_create(
+                course_id=course_id,
+                defaults={
+                    "section_status": {},
+                    "quiz_results": {}
+                }
+            )
+
+        if progress.section_status or progress.quiz_results:
+            await StudentProgressRepository.backfill_legacy_progress(progress)
+
+        if cache is not None:
+            cache[course_id] = progress
         return progress
     
+    @staticmethod
+    async def backfill_legacy_progress(progress: StudentCourseTracker) -> None:
+        """Move progress recorded in the legacy JSON columns into rows, then clear the columns"""
+        sections = [
+            SectionProgress(tracker_id=progress.id, section_id=section_id, status=SectionStatus(status))
+            for section_id, status in progress.section_status.items()
+        ]
+        attempts = [
+            QuizAttempt(
+                tracker_id=progress.id,
+                section_id=section_id,
+                quiz_id=str(data["quiz_id"]),
+                score=float(data["score"]),
+                completed_at=datetime.fromisoformat(data["completed_at"]),
+                answers=data["answers"],
+                incorrect_questions=data["incorrect_questions"]
+            )
+            for section_id, attempts_data in progress.quiz_results.items()
+            for data in attempts_data
+        ]
+        
+        # Clearing the columns in the same transaction makes this run once
+        async with in_transaction("default"):
+            if sections:
+                # Rows written since take precedence over the legacy status
+                await SectionProgress.bulk_create(sections, ignore_conflicts=True)
+            if attempts:
+                await QuizAttempt.bulk_create(attempts)
+            progress.section_status = {}
+            progress.quiz_results = {}
+            await progress.save(update_fields=["section_status", "quiz_results"])
+    
     @staticmethod
     async def update_section_status(
         progress: StudentCourseTracker,
@@ -81,8 +149,12 @@ class StudentProgressRepository:
         status: SectionStatus
     ) -> None:
         """Update the status of a section"""
-        progress.section_status[section_id] = status.value
-        await progress.save()
+        # Insert or overwrite the (tracker, section) row in one statement
+        await SectionProgress.bulk_create(
+            [SectionProgress(tracker_id=progress.id, section_id=section_id, status=status)],
+            on_conflict=["tracker_id", "section_id"],
+            update_fields=["status"]
+        )
     
     @staticmethod
     async def add_quiz_attempt(
@@ -91,12 +163,36 @@ class StudentProgressRepository:
         attempt: QuizAttempt
     ) -> None:
         """Add a new quiz attempt"""
-        if section_id not in progress.quiz_results:
-            progress.quiz_results[section_id] = []
-            
-        # Convert attempt to dict for storage
-        progress.quiz_results[section_id].append(attempt.to_dict())
-        await progress.save()
+        attempt.tracker_id = progress.id
+        attempt.section_id = section_id
+        await attempt.save()
+    
+    @staticmethod
+    async def start_section(
+        progress: StudentCourseTracker,
+        section_id: str,
+        section_index: int
+    ) -> None:
+        """Mark a section in progress and make it the current one"""
+        async with in_transaction("default"):
+            await StudentProgressRepository.update_section_status(progress, section_id, SectionStatus.IN_PROGRESS)
+            progress.current_section_index = section_index
+            await progress.save(update_fields=["current_section_index", "last_accessed"])
+    
+    @staticmethod
+    async def complete_section(
+        progress: StudentCourseTracker,
+        section_id: str,
+        attempt: Optional[QuizAttempt] = None,
+        complete_course: bool = False
+    ) -> None:
+        """Mark a section completed, in one transaction with the quiz attempt and course completion if given"""
+        async with in_transaction("default"):
+            await StudentProgressRepository.update_section_status(progress, section_id, SectionStatus.COMPLETED)
+            if attempt is not None:
+                await StudentProgressRepository.add_quiz_attempt(progress, section_id, attempt)
+            if complete_course:
+                await StudentProgressRepository.mark_course_completed(progress)
     
     @staticmethod
     async def get_quiz_attempts(
@@ -104,15 +200,22 @@ class StudentProgressRepository:
         section_id: str
     ) -> List[QuizAttempt]:
         """Get all quiz attempts for a section"""
-        attempts_data = progress.quiz_results.get(section_id, [])
-        return [QuizAttempt.from_dict(data) for data in attempts_data]
+        return await QuizAttempt.filter(tracker_id=progress.id, section_id=section_id).order_by("id")
+    
+    @staticmethod
+    async def get_quiz_attempts_by_section(progress: StudentCourseTracker) -> Dict[str, List[QuizAttempt]]:
+        """Get the quiz attempts for every section in one query, keyed by section ID"""
+        attempts_by_section: Dict[str, List[QuizAttempt]] = {}
+        for attempt in await QuizAttempt.filter(tracker_id=progress.id).order_by("id"):
+            attempts_by_section.setdefault(attempt.section_id, []).append(attempt)
+        return attempts_by_section
     
     @staticmethod
     async def mark_course_completed(progress: StudentCourseTracker) -> None:
         """Mark the course as completed"""
         progress.completed = True
-        progress.completed_at = datetime.utcnow()
-        await progress.save()
+        progress.completed_at = timezone.now()
+        await progress.save(update_fields=["completed", "completed_at", "last_accessed"])
     
     @staticmethod
     async def get_section_status(
@@ -120,7 +223,14 @@ class StudentProgressRepository:
         section_id: str
     ) -> SectionStatus:
         """Get the status of a section"""
-        return SectionStatus(progress.section_status.get(section_id, SectionStatus.NOT_STARTED.value))
+        row = await SectionProgress.get_or_none(tracker_id=progress.id, section_id=section_id)
+        return row.status if row else SectionStatus.NOT_STARTED
+    
+    @staticmethod
+    async def get_section_statuses(progress: StudentCourseTracker) -> Dict[str, SectionStatus]:
+        """Get the status of every section the student has touched, keyed by section ID"""
+        rows = await SectionProgress.filter(tracker_id=progress.id).values_list("section_id", "status")
+        return {section_id: SectionStatus(status) for section_id, status in rows}
     
     @staticmethod
     async def update_current_section(
@@ -129,4 +239,4 @@ class StudentProgressRepository:
     ) -> None:
         """Update the current section index"""
         progress.current_section_index = section_index
-        await progress.save() 
\ No newline at end of file
+        await progress.save(update_fields=["current_section_index", "last_accessed"]) 
\ No newline at end of file
@@ -1,5 +1,8 @@
+import os
 import re
+from functools import lru_cache
 from typing import List, Tuple
+import pptx
 from pptx import Presentation
 from pptx.util import Inches, Pt
 from pptx.enum.text import PP_ALIGN
@@ -7,6 +10,17 @@ from pptx.text.text import _Run
 import streamlit as st
 import io
 
+_HEADING_RE = re.compile(r'^(#{1,3})\s+(.+)$')
+
+# The template Presentation() opens when given no file
+_DEFAULT_TEMPLATE_PATH = os.path.join(os.path.dirname(pptx.__file__), 'templates', 'default.pptx')
+
+@lru_cache(maxsize=1)
+def _default_template_bytes() -> bytes:
+    """Read python-pptx's default template once per process."""
+    with open(_DEFAULT_TEMPLATE_PATH, 'rb') as f:
+        return f.read()
+
 def format_text_run(run: _Run, text: str):
     """Apply formatting to a text run based on markdown syntax."""
     # Remove the formatting markers
@@ -25,98 +39,155 @@ def format_text_run(run: _Run, text: str):
         run.font.bold = True
     run.text = text
 
-def format_paragraph_text(paragraph, text: str):
-    """Parse and format text with markdown syntax."""
-    # Set default paragraph level to 0 (no bullets)
-    paragraph.level = 0
-    
-    # Split text into formatting segments
+@lru_cache(maxsize=4096)
+def _scan_inline(text: str) -> Tuple[Tuple[str, str], ...]:
+    """Split text into (segment, format) pairs in one left-to-right pass.
+
+    Recognises **bold**, _italic_ and #### headings. As with non-greedy
+    regexes, a marker closes at its nearest closer on the same line.
+    Once a closer is known to be missing for the rest of a line, later
+    openers on that line are not searched again, so the scan stays linear.
+    """
     segments = []
-    current_pos = 0
-    
-    # Find all formatting patterns
-    patterns = [
-        (r'\*\*.*?\*\*', 'bold'),     # Bold
-        (r'_.*?_', 'italic'),         # Italic (underscore style)
-        (r'####.*?($|\n)', 'h4')      # Level 4 heading
-    ]
-    
-    # Find all matches for all patterns
-    matches = []
-    for pattern, fmt_type in patterns:
-        for match in re.finditer(pattern, text):
-            matches.append((match.start(), match.end(), match.group(), fmt_type))
-    
-    # Sort matches by start position
-    matches.sort(key=lambda x: x[0])
-    
-    # Process matches and non-formatted text
-    current_pos = 0
-    for start, end, content, fmt_type in matches:
+    length = len(text)
+    plain_start = 0
+    line_end = -1
+    # Per-marker position up to which no closer exists
+    no_closer_until = {'**': -1, '_': -1}
+    i = 0
+    while i < length:
+        if i > line_end:
+            line_end = text.find('\n', i)
+            if line_end == -1:
+                line_end = length
+
+        fmt_type = None
+        if text.startswith('**', i) and i >= no_closer_until['**']:
+            close = text.find('**', i + 2, line_end)
+            if close == -1:
+                no_closer_until['**'] = line_end
+            else:
+                fmt_type, end = 'bold', close + 2
+        elif text[i] == '_' and i >= no_closer_until['_']:
+            close = text.find('_', i + 1, line_end)
+            if close == -1:
+                no_closer_until['_'] = line_end
+            else:
+                fmt_type, end = 'italic', close + 1
+        elif text.startswith('####', i):
+            # Runs to the end of the line, taking its newline unless it is
+            # the final character of the text
+            fmt_type, end = 'h4', line_end + 1 if line_end < length - 1 else line_end
+
+        if fmt_type is None:
+            i += 1
+            continue
+
         # Add non-formatted text before the match
-        if start > current_pos:
-            segments.append((text[current_pos:start], 'normal'))
-        segments.append((content, fmt_type))
-        current_pos = end
-    
+        if i > plain_start:
+            segments.append((text[plain_start:i], 'normal'))
+        segments.append((text[i:end], fmt_type))
+        i = plain_start = end
+
     # Add remaining text
-    if current_pos < len(text):
-        segments.append((text[current_pos:], 'normal'))
-    
-    # Apply formatting to each segment
-    for text_segment, fmt_type in segments:
-        run = paragraph.add_run()
+    if plain_start < length:
+        segments.append((text[plain_start:], 'normal'))
+
+    # Cached and shared between callers, so hand back an immutable result
+    return tuple(segments)
+
+# Font size of #### headings, in the centipoints the XML stores
+_H4_SIZE = Pt(14).centipoints
+
+def _fill_paragraph(p, text: str):
+    """Append formatted runs for text to an <a:p> element.
+
+    Builds the <a:r>/<a:rPr> elements directly instead of going through
+    python-pptx's run and font proxies, which are created per run.
+    """
+    # Set default paragraph level to 0 (no bullets)
+    p.get_or_add_pPr().lvl = 0
+
+    for text_segment, fmt_type in _scan_inline(text):
+        r = p.add_r()
         if fmt_type == 'bold':
-            run.font.bold = True
-            run.text = text_segment[2:-2]  # Remove ** markers
+            r.get_or_add_rPr().b = True
+            r.text = text_segment[2:-2]  # Remove ** markers
         elif fmt_type == 'italic':
-            run.font.italic = True
-            run.text = text_segment[1:-1]  # Remove _ markers
+            r.get_or_add_rPr().i = True
+            r.text = text_segment[1:-1]  # Remove _ markers
         elif fmt_type == 'h4':
-            run.font.bold = True
-            run.font.size = Pt(14)
-            run.text = text_segment[4:].strip()  # Remove #### marker
+            rPr = r.get_or_add_rPr()
+            rPr.b = True
+            rPr.sz = _H4_SIZE
+            r.text = text_segment[4:].strip()  # Remove #### marker
         else:
-            run.text = text_segment
+            r.text = text_segment
+
+def format_paragraph_text(paragraph, text: str):
+    """Parse and format text with markdown syntax."""
+    _fill_paragraph(paragraph._p, text)
 
+@st.cache_data(max_entries=64, show_spinner=False)
 def parse_markdown_content(content: str) -> List[Tuple[str, str]]:
     """
     Parse markdown content into slides, where each slide has a title and content.
     Returns a list of tuples (title, content).
     """
-    # First split content by horizontal rule separator
-    slide_chunks = re.split(r'\n\s*---\s*\n', content)
-    
     slides = []
+    current_title = None
+    current_content = []
+    lines = content.split('\n')
+    last_index = len(lines) - 1
+    # The first non-blank line of each chunk has its indentation removed
+    at_chunk_start = True
+    # A separator swallows the blank lines after it, so a "---" reached
+    # through only blank lines is a plain horizontal rule
+    after_separator = False
     
-    for chunk in slide_chunks:
-        # Split chunk into lines
-        lines = chunk.strip().split('\n')
-        current_title = None
-        current_content = []
-        
-        for line in lines:
-            # Skip horizontal rule lines
-            if re.match(r'^\s*---\s*$', line):
-                continue
-                
-            # Check if line is a heading (h1, h2, h3)
-            heading_match = re.match(r'^(#{1,3})\s+(.+)$', line)
-            if heading_match:
-                # If we have a previous slide, save it
-                if current_title:
+    # One pass over the lines; a "---" line between two others separates slides
+    for index, line in enumerate(lines):
+        stripped = line.strip()
+        if stripped == '---':
+            if 0 < index < last_index and not after_separator:
+                # Add the last slide from this chunk if exists
+                if current_title and current_content:
                     slides.append((current_title, '\n'.join(current_content).strip()))
-                # Start new slide
-                current_title = heading_match.group(2)
+                current_title = None
                 current_content = []
+                at_chunk_start = True
+                after_separator = True
             else:
-                # Add line to current content if we have a title
-                if current_title and line.strip():
-                    current_content.append(line)
+                # Skip horizontal rule lines
+                at_chunk_start = False
+                after_separator = False
+            continue
+        
+        if not stripped:
+            continue
+        after_separator = False
         
-        # Add the last slide from this chunk if exists
-        if current_title and current_content:
-            slides.append((current_title, '\n'.join(current_content).strip()))
+        if at_chunk_start:
+            line = line.lstrip()
+            at_chunk_start = False
+            
+        # Check if line is a heading (h1, h2, h3); most lines are body text,
+        # so only lines starting with '#' go through the regex
+        heading_match = _HEADING_RE.match(line) if line[0] == '#' else None
+        if heading_match:
+            # If we have a previous slide, save it
+            if current_title:
+                slides.append((current_title, '\n'.join(current_content).strip()))
+            # Start new slide
+            current_title = heading_match.group(2)
+            current_content = []
+        elif current_title:
+            # Add line to current content if we have a title
+            current_content.append(line)
+    
+    # Add the final slide if exists
+    if current_title and current_content:
+        slides.append((current_title, '\n'.join(current_content).strip()))
     
     return slides
 
@@ -124,7 +195,8 @@ def create_presentation(slides: List[Tuple[str, str]]) -> Presentation:
     """
     Create a PowerPoint presentation from the parsed slides.
     """
-    prs = Presentation()
+    # Open the default template from memory rather than from disk each time
+    prs = Presentation(io.BytesIO(_default_template_bytes()))
     
     # Define slide layouts
     title_slide_layout = prs.slide_layouts[0]  # Title slide
@@ -151,37 +223,36 @@ def create_presentation(slides: List[Tuple[str, str]]) -> Presentation:
         title_shape = slide.shapes.title
         title_shape.text = title
         
-        # Set content with formatting
-        content_shape = slide.placeholders[1]
-        tf = content_shape.text_frame
-        tf.clear()  # Clear existing paragraphs
+        # Set content with formatting, writing the paragraphs straight into
+        # the text body in document order
+        txBody = slide.placeholders[1].text_frame._txBody
+        for p in txBody.p_lst:  # Clear existing paragraphs
+            txBody.remove(p)
         
         # Split content into paragraphs
-        paragraphs = content.split('\n')
-        
-        for i, para_text in enumerate(paragraphs):
+        for para_text in content.split('\n'):
             # Skip empty lines
             if not para_text.strip():
                 continue
-                
-            # Create new paragraph
-            if i == 0:
-                paragraph = tf.paragraphs[0]
-            else:
-                paragraph = tf.add_paragraph()
             
+            p = txBody.add_p()
             # Format the paragraph text (this will also set the correct level)
-            format_paragraph_text(paragraph, para_text)
+            _fill_paragraph(p, para_text)
             
             # Set paragraph properties
-            paragraph.alignment = PP_ALIGN.LEFT
+            p.get_or_add_pPr().algn = PP_ALIGN.LEFT
+        
+        # A text body needs at least one paragraph
+        if not txBody.p_lst:
+            txBody.add_p()
     
     return prs
 
-def generate_ppt_from_markdown(content: str) -> bytes:
+def generate_ppt_from_markdown(content: str) -> io.BytesIO:
     """
     Generate a PowerPoint presentation from markdown content.
-    Returns the presentation as bytes.
+    Returns the presentation as an in-memory file positioned at the start,
+    ready to hand to st.download_button without copying it to bytes first.
     """
     # Parse markdown into slides
     slides = parse_markdown_content(content)
@@ -193,8 +264,8 @@ def generate_ppt_from_markdown(content: str) -> bytes:
     prs = create_presentation(slides)
     
     # Save to bytes
-    pptx_bytes = io.BytesIO()
-    prs.save(pptx_bytes)
-    pptx_bytes.seek(0)
+    pptx_file = io.BytesIO()
+    prs.save(pptx_file)
+    pptx_file.seek(0)
     
-    return pptx_bytes.getvalue() 
\ No newline at end of file
+    return pptx_file 
\ No newline at end of file
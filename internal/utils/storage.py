@@ -1,21 +1,83 @@
+import atexit
+import io
+import multiprocessing
 import os
-from typing import List
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from itertools import repeat
+from typing import BinaryIO, List, Optional, Set, Tuple
 from pathlib import Path
 import streamlit as st
 import streamlit.runtime.uploaded_file_manager
 from PyPDF2 import PdfReader
-import io
+
+# pypdfium2 wraps the C++ PDFium library and extracts text many times faster
+# than PyPDF2. It is optional; without it PyPDF2 is used.
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+# PDFium is not thread-safe, even across separate documents
+_pdfium_lock = threading.Lock()
+
+# Uploads saved as UTF-8 text; everything else except PDFs is kept as-is
+_TEXT_EXTENSIONS = frozenset({'txt', 'md', 'py', 'js', 'html', 'css', 'json', 'xml', 'csv'})
+
+# PDFs with at least this many pages have their pages split across worker
+# processes; PyPDF2 is pure Python, so threads would only contend for the GIL
+PDF_PARALLEL_MIN_PAGES = 50
+
+# Upper bound on page extraction worker processes
+PDF_MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+_pdf_process_pool: Optional[ProcessPoolExecutor] = None
+_pdf_process_pool_lock = threading.Lock()
+
+
+def _get_pdf_process_pool() -> ProcessPoolExecutor:
+    """Process pool for page extraction, started on first use and shared.
+
+    Workers are spawned rather than forked: the pool is first used from a
+    worker thread, and forking a threaded process can copy held locks into
+    the child and deadlock it.
+    """
+    global _pdf_process_pool
+    with _pdf_process_pool_lock:
+        if _pdf_process_pool is None:
+            _pdf_process_pool = ProcessPoolExecutor(
+                max_workers=PDF_MAX_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            atexit.register(_pdf_process_pool.shutdown, cancel_futures=True)
+        return _pdf_process_pool
+
+
+def _extract_page_range(data: bytes, start: int, stop: int) -> List[str]:
+    """Extract the text of pages [start, stop) from PDF bytes, in a worker process."""
+    pdf_reader = PdfReader(io.BytesIO(data))
+    return [pdf_reader.pages[i].extract_text() for i in range(start, stop)]
+
+# Directories already created by this process. Handlers are constructed per
+# call, so this is shared at module level rather than kept per instance.
+_ensured_dirs: Set[str] = set()
+
+
+def _ensure_dir(path: str) -> None:
+    if path not in _ensured_dirs:
+        Path(path).mkdir(parents=True, exist_ok=True)
+        _ensured_dirs.add(path)
 
 
 class StorageHandler:
     def __init__(self, base_dir: str = "storage"):
         self.base_dir = base_dir
-        Path(self.base_dir).mkdir(parents=True, exist_ok=True)
+        _ensure_dir(self.base_dir)
 
     def get_course_dir(self, course_id: str | int) -> str:
         """Get the directory path for a specific course."""
         course_dir = os.path.join(self.base_dir, str(course_id))
-        Path(course_dir).mkdir(parents=True, exist_ok=True)
+        _ensure_dir(course_dir)
         return course_dir
 
     def save_files(self, course_id: str, files: List[streamlit.runtime.uploaded_file_manager.UploadedFile]) -> List[str]:
@@ -30,31 +92,29 @@ class StorageHandler:
         """
         course_dir = self.get_course_dir(course_id)
         saved_file_paths = []
+        # PDFs whose text still has to be extracted, as (file, file_path)
+        pending_pdfs = []
 
         for file in files:
             # Clean the filename to prevent path traversal
             safe_filename = os.path.basename(file.name)
             file_path = os.path.join(course_dir, safe_filename)
             
-            # Determine file type based on extension
-            ext = os.path.splitext(safe_filename)[1].lower()
-            text_extensions = {'.txt', '.md', '.py', '.js', '.html', '.css', '.json', '.xml', '.csv'}
+            # Determine file type based on extension; files without a dot get
+            # an empty extension, as with os.path.splitext
+            stem, dot, ext = safe_filename.rpartition('.')
+            ext = ext.lower() if dot and stem else ''
             
             try:
-                if ext == '.pdf':
-                    # For PDF files, extract text and save both binary and text
-                    # Save binary PDF
+                if ext == 'pdf':
+                    # For PDF files, save the binary now and extract the text
+                    # below, in parallel with the other PDFs
                     with open(file_path, "wb") as f:
                         f.write(file.getbuffer())
+                    saved_file_paths.append(file_path)
+                    pending_pdfs.append((file, file_path))
                     
-                    # Extract and save text content
-                    text_content = self._extract_pdf_text(file)
-                    text_file_path = file_path + '.txt'
-                    with open(text_file_path, "w", encoding='utf-8') as f:
-                        f.write(text_content)
-                    saved_file_paths.extend([file_path, text_file_path])
-                    
-                elif ext in text_extensions:
+                elif ext in _TEXT_EXTENSIONS:
                     # For text files, decode and save as UTF-8
                     content = file.getvalue().decode('utf-8', errors='replace')
                     with open(file_path, "w", encoding='utf-8') as f:
@@ -69,31 +129,98 @@ class StorageHandler:
             except Exception as e:
                 st.error(f"Error saving file {safe_filename}: {str(e)}")
                 continue
+
+        if pending_pdfs:
+            saved_file_paths.extend(self._save_pdf_texts(pending_pdfs))
                 
         return saved_file_paths
 
-    def _extract_pdf_text(self, file) -> str:
+    def _save_pdf_texts(self, pdfs: List[Tuple[streamlit.runtime.uploaded_file_manager.UploadedFile, str]]) -> List[str]:
+        """Extract text from PDFs in a thread pool and save each next to its PDF.
+
+        Worker threads have no Streamlit script context, so errors are
+        reported from this thread as each extraction completes.
+
+        Args:
+            pdfs: (uploaded file, saved PDF path) pairs
+
+        Returns:
+            List of the text file paths written.
+        """
+        text_file_paths = []
+        with ThreadPoolExecutor(max_workers=min(8, len(pdfs))) as pool:
+            futures = {pool.submit(self._extract_pdf_text, file): file_path for file, file_path in pdfs}
+            for future in as_completed(futures):
+                file_path = futures[future]
+                try:
+                    text_content = future.result()
+                except Exception as e:
+                    st.error(f"Error extracting text from PDF: {str(e)}")
+                    text_content = ""
+
+                text_file_path = file_path + '.txt'
+                try:
+                    with open(text_file_path, "w", encoding='utf-8') as f:
+                        f.write(text_content)
+                    text_file_paths.append(text_file_path)
+                except Exception as e:
+                    st.error(f"Error saving file {os.path.basename(text_file_path)}: {str(e)}")
+        return text_file_paths
+
+    def _extract_pdf_text(self, file: BinaryIO) -> str:
         """Extract text from a PDF file.
         
         Args:
-            file: PDF file object
+            file: Seekable PDF file object. It is parsed in place rather
+                than copied, since uploads are already held in memory.
             
         Returns:
             Extracted text content
         """
-        try:
-            # Create PDF reader object
-            pdf_reader = PdfReader(io.BytesIO(file.getvalue()))
+        if pdfium is not None:
+            return self._extract_pdf_text_pdfium(file)
+
+        # Create PDF reader object
+        file.seek(0)
+        pdf_reader = PdfReader(file)
+        page_count = len(pdf_reader.pages)
+        
+        # Extract text from all pages
+        if page_count < PDF_PARALLEL_MIN_PAGES:
+            return "\n\n".join(page.extract_text() for page in pdf_reader.pages)
+
+        # Large PDFs: each worker re-opens the bytes and extracts one
+        # contiguous range of pages; map keeps the ranges in order
+        workers = PDF_MAX_WORKERS
+        step = -(-page_count // workers)
+        starts = range(0, page_count, step)
+        stops = [min(start + step, page_count) for start in starts]
+        ranges = _get_pdf_process_pool().map(_extract_page_range, repeat(file.getvalue()), starts, stops)
+        return "\n\n".join(text for page_texts in ranges for text in page_texts)
+
+    def _extract_pdf_text_pdfium(self, file: BinaryIO) -> str:
+        """Extract text from a PDF file with PDFium.
+        
+        Args:
+            file: Seekable PDF file object
             
-            # Extract text from all pages
-            text_content = []
-            for page in pdf_reader.pages:
-                text_content.append(page.extract_text())
+        Returns:
+            Extracted text content
+        """
+        text_content = []
+        with _pdfium_lock:
+            file.seek(0)
+            pdf = pdfium.PdfDocument(file)
+            try:
+                for page in pdf:
+                    text_page = page.get_textpage()
+                    text_content.append(text_page.get_text_range())
+                    text_page.close()
+                    page.close()
+            finally:
+                pdf.close()
                 
-            return "\n\n".join(text_content)
-        except Exception as e:
-            st.error(f"Error extracting text from PDF: {str(e)}")
-            return ""
+        return "\n\n".join(text_content)
 
     def list_files(self, course_id: str) -> List[str]:
         """List all files in the course directory.
@@ -104,8 +231,14 @@ class StorageHandler:
         Returns:
             List of file paths in the course directory.
         """
-        course_dir = self.get_course_dir(course_id)
-        return [os.path.join(course_dir, f) for f in os.listdir(course_dir) if os.path.isfile(os.path.join(course_dir, f))]
+        # Reading never needs the directory to exist, so skip the mkdir
+        course_dir = os.path.join(self.base_dir, str(course_id))
+        try:
+            # DirEntry caches the file type, so no stat per entry
+            with os.scandir(course_dir) as entries:
+                return [entry.path for entry in entries if entry.is_file()]
+        except FileNotFoundError:
+            return []
 
     def delete_files(self, course_id: str) -> None:
         """Delete all files in the course directory.
@@ -113,8 +246,5 @@ class StorageHandler:
         Args:
             course_id: The ID of the course.
         """
-        course_dir = self.get_course_dir(course_id)
-        for file in os.listdir(course_dir):
-            file_path = os.path.join(course_dir, file)
-            if os.path.isfile(file_path):
-                os.remove(file_path)
\ No newline at end of file
+        for file_path in self.list_files(course_id):
+            os.remove(file_path)
\ No newline at end of file
@@ -3,7 +3,8 @@ import streamlit as st
 from dotenv import load_dotenv
 import os
 
-from internal.utils.db import init_db
+from internal.repository.student_progress import reset_progress_cache
+from internal.utils.db import ensure_db
 from pages.course_editor import course_editor_page
 from pages.course_list import course_list_page
 from pages.take_content import take_content_page
@@ -65,8 +66,24 @@ def render_navbar():
 
 
 async def main():
-    # Project Initialization
-    await init_db()
+    # Project Initialization; Tortoise's connections are shared by every
+    # session, so this only does work on the first run in the process
+    ensure_db()
+
+    # Trackers are cached for this run only
+    reset_progress_cache()
+
+    # Progress saves left running in the background by the previous run;
+    # wait for them before any page reads progress
+    pending_writes = st.session_state.pop("pending_progress_writes", None)
+    if pending_writes:
+        results = await asyncio.gather(
+            *(asyncio.wrap_future(write) for write in pending_writes),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                st.error(f"Failed to save progress: {str(result)}")
 
     # Render UI
     render_navbar()
@@ -105,7 +122,9 @@ async def main():
 
 
 # Streamlit doesn't allow `asyncio.run()` multiple times.
-# Instead, use `asyncio.create_task()` with the event loop from session state.
+# Instead, run each rerun on the event loop from session state. main() must run
+# on the script thread: st.rerun() and st.stop() only interrupt the script
+# there. Work that outlives a rerun goes to the database loop instead.
 if __name__ == "__main__":
     st.set_page_config(
         page_title="Essential5 Learning Platform",
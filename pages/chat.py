@@ -0,0 +1,38 @@
+import streamlit as st
+from typing import Tuple
+
+from smolagents import ToolCallingAgent
+
+from internal.handlers.intelligence import IntelligenceHandler
+
+
+def initialize_chatbots():
+    """Initialize the chatbot pool shared by the content and quiz pages."""
+    # Chatbot agents and their system prompts, keyed by (course ID, section ID)
+    if 'chatbots' not in st.session_state:
+        st.session_state.chatbots = {}
+
+async def get_section_chatbot(course_id: int, section_id: str, spinner_text: str) -> Tuple[ToolCallingAgent, str]:
+    """Get a section's chatbot and system prompt, building them the first time the section needs one."""
+    chatbot_key = (str(course_id), section_id)
+    if chatbot_key not in st.session_state.chatbots:
+        with st.spinner(spinner_text):
+            st.session_state.chatbots[chatbot_key] = await IntelligenceHandler.get_course_chatbot(*chatbot_key)
+    return st.session_state.chatbots[chatbot_key]
+
+def drop_section_chatbot(course_id: int, section_id: str):
+    """Forget a section's chatbot so the next use builds a new one."""
+    st.session_state.chatbots.pop((str(course_id), section_id), None)
+
+def write_chatbot_reply(chatbot_agent: ToolCallingAgent, prompt: str) -> str:
+    """Run the chatbot on a prompt inside the current chat message and return its reply."""
+    # Report each agent step as it finishes, then put the answer in its place
+    reply = st.empty()
+    reply.caption("Thinking...")
+    response = IntelligenceHandler.run_chat_agent(
+        chatbot_agent,
+        prompt,
+        lambda step: reply.caption(f"Thinking... (step {step} done)")
+    )
+    reply.markdown(response)
+    return response
@@ -1,7 +1,9 @@
 import logging
 import streamlit as st
+import pandas as pd
 
 from internal.handlers.course import CourseViewHandler, CourseDeleteHandler
+from internal.handlers.intelligence import IntelligenceHandler
 
 logger = logging.getLogger(__name__)
 
@@ -22,60 +24,83 @@ async def content_creator_course_list_page():
             st.info("No courses created yet. Click 'Create New Course' to get started.")
             return
             
-        # Display courses in a table format for better management
-        for i, course in enumerate(courses):
-            with st.expander(f"{course.title} ({course.is_active and 'Published' or 'Draft'})"):
-                st.write(f"**Description:** {course.description}")
-                st.write(f"**Duration:** {course.duration or 'N/A'} hours")
-                st.write(f"**Target Audience:** {course.target_audience or 'N/A'}")
-                
-                col1, col2, col3 = st.columns([1, 1, 1])
-                with col1:
-                    if st.button("View Details", key=f"view_{i}"):
-                        st.session_state.current_page = "course_detail"
-                        st.session_state.selected_course_id = course.id
-                        st.rerun()
-                with col2:
-                    if st.button("Preview", key=f"preview_{i}"):
-                        st.session_state.current_page = "take_course"
-                        st.session_state.selected_course = course
-                        st.rerun()
-                with col3:
-                    delete_key = f"delete_{course.id}"
-                    confirm_key = f"confirm_{course.id}"
-                    
-                    # Initialize the confirmation state if not exists
-                    if delete_key not in st.session_state:
-                        st.session_state[delete_key] = False
-                    
-                    if not st.session_state[delete_key]:
-                        # Show initial delete button
-                        if st.button("Delete", key=f"del_btn_{course.id}", type="secondary"):
-                            st.session_state[delete_key] = True
-                            st.rerun()
-                    else:
-                        # Show confirmation dialog
-                        st.warning(f"Are you sure you want to delete '{course.title}'?")
-                        confirm_col1, confirm_col2 = st.columns([1, 1])
-                        
-                        with confirm_col1:
-                            if st.button("Yes, delete", key=f"yes_{course.id}", type="primary"):
-                                try:
-                                    if await CourseDeleteHandler.delete_course(str(course.id)):
-                                        st.success(f"Course '{course.title}' deleted successfully!")
-                                        # Reset the state
-                                        st.session_state[delete_key] = False
-                                        st.rerun()
-                                    else:
-                                        st.error("Course not found. It may have been already deleted.")
-                                except Exception as e:
-                                    st.error(f"Error deleting course: {str(e)}")
-                                    logger.error(f"Failed to delete course {course.id}: {str(e)}")
-                        
-                        with confirm_col2:
-                            if st.button("No, cancel", key=f"no_{course.id}"):
+        # Pending delete confirmations keyed by course ID; drop any left
+        # behind by courses that no longer exist
+        delete_states = st.session_state.setdefault("delete_states", {})
+        course_ids = {course.id for course in courses}
+        for stale_id in delete_states.keys() - course_ids:
+            del delete_states[stale_id]
+
+        # Display all courses in one table; only the selected course gets
+        # its detail and action widgets, rather than an expander per course
+        table = pd.DataFrame({
+            "Title": [course.title for course in courses],
+            "Status": ["Published" if course.is_active else "Draft" for course in courses],
+            "Duration (hours)": [course.duration for course in courses],
+            "Target Audience": [course.target_audience or "N/A" for course in courses],
+        })
+        event = st.dataframe(
+            table,
+            key="course_table",
+            hide_index=True,
+            use_container_width=True,
+            on_select="rerun",
+            selection_mode="single-row",
+        )
+
+        selected_rows = event.selection.rows
+        # The selection can point past the end after a course is deleted
+        if not selected_rows or selected_rows[0] >= len(courses):
+            st.caption("Select a course to manage it.")
+            return
+
+        course = courses[selected_rows[0]]
+        st.subheader(course.title)
+        st.write(f"**Description:** {course.description}")
+        st.write(f"**Duration:** {course.duration or 'N/A'} hours")
+        st.write(f"**Target Audience:** {course.target_audience or 'N/A'}")
+
+        col1, col2, col3 = st.columns([1, 1, 1])
+        with col1:
+            if st.button("View Details", key=f"view_{course.id}"):
+                st.session_state.current_page = "course_detail"
+                st.session_state.selected_course_id = course.id
+                st.rerun()
+        with col2:
+            if st.button("Preview", key=f"preview_{course.id}"):
+                st.session_state.current_page = "take_course"
+                st.session_state.selected_course = course
+                st.rerun()
+        with col3:
+            if not delete_states.get(course.id, False):
+                # Show initial delete button
+                if st.button("Delete", key=f"del_btn_{course.id}", type="secondary"):
+                    delete_states[course.id] = True
+                    st.rerun()
+            else:
+                # Show confirmation dialog
+                st.warning(f"Are you sure you want to delete '{course.title}'?")
+                confirm_col1, confirm_col2 = st.columns([1, 1])
+
+                with confirm_col1:
+                    if st.button("Yes, delete", key=f"yes_{course.id}", type="primary"):
+                        try:
+                            if await CourseDeleteHandler.delete_course(str(course.id)):
+                                IntelligenceHandler.invalidate_retriever(course.id)
+                                st.success(f"Course '{course.title}' deleted successfully!")
                                 # Reset the state
-                                st.session_state[delete_key] = False
+                                delete_states.pop(course.id, None)
                                 st.rerun()
+                            else:
+                                st.error("Course not found. It may have been already deleted.")
+                        except Exception as e:
+                            st.error(f"Error deleting course: {str(e)}")
+                            logger.error(f"Failed to delete course {course.id}: {str(e)}")
+
+                with confirm_col2:
+                    if st.button("No, cancel", key=f"no_{course.id}"):
+                        # Reset the state
+                        delete_states[course.id] = False
+                        st.rerun()
     except Exception as e:
         st.error(f"Error loading courses: {str(e)}") 
\ No newline at end of file
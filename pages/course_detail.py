@@ -2,13 +2,19 @@ import streamlit as st
 from typing import Optional, List
 
 from internal.handlers.course import CourseViewHandler, CourseCreateHandler
-from internal.repository.course import LessonType, OutlineSection, QuizType
+from internal.repository.course import LessonType, OutlineSection, LESSON_TYPES, LESSON_TYPE_INDEX
+from internal.utils.db import on_db_loop, submit_to_db_loop
 from internal.utils.storage import StorageHandler
 from internal.handlers.intelligence import IntelligenceHandler
-from internal.custom_types.quiz import Quiz, MultipleChoiceQuestion, FillInBlankQuestion
+from internal.custom_types.quiz import Quiz
 from internal.utils.ppt_generator import generate_ppt_from_markdown
+from internal.utils.cache import LRUCache
 from pages.quiz_editor import display_student_preview
 
+# Validated preview quizzes keyed by (quiz ID, updated_at), so a saved edit
+# gets a new key. Shared between sessions and must not be mutated.
+_preview_quiz_cache = LRUCache(maxsize=64)
+
 def initialize_session_state():
     """Initialize session state variables for course detail page"""
     if 'course_detail_initialized' not in st.session_state:
@@ -18,6 +24,11 @@ def initialize_session_state():
         st.session_state.section_content = {}
         st.session_state.expanded_sections = set()  # Track expanded sections
 
+@st.cache_data(max_entries=32, show_spinner=False)
+def generate_ppt_cached(markdown: str) -> bytes:
+    """Build the PPT for a section's markdown once per distinct content."""
+    return generate_ppt_from_markdown(markdown).getvalue()
+
 async def display_quiz_preview(section: OutlineSection):
     """Display a preview of the quiz for students."""
     if not section.quiz:
@@ -31,37 +42,19 @@ async def display_quiz_preview(section: OutlineSection):
             st.warning("Quiz data could not be loaded.")
             return
         
-        # Create Quiz object with the correct type
-        quiz = Quiz(
-            type=QuizType(quiz_data.type.value if hasattr(quiz_data.type, 'value') else quiz_data.type),
-            questions=[]
-        )
-        
-        # Get the stored questions from the quiz_data's questions field
-        stored_questions = quiz_data.questions
-        if not stored_questions:
+        if not quiz_data.questions:
             st.warning("This quiz has no questions yet.")
             return
-            
-        # Convert each stored question to the appropriate question object
-        for q in stored_questions:
-            if quiz.type == QuizType.MULTIPLE_CHOICE:
-                question = MultipleChoiceQuestion(
-                    question=q["question"],
-                    options=q["options"],
-                    correct_answer=q["correct_answer"],
-                    justification=q["justification"]
-                )
-            else:
-                question = FillInBlankQuestion(
-                    question=q["question"],
-                    correct_answer=q["correct_answer"],
-                    justification=q["justification"]
-                )
-            
-            if question.validate():
-                quiz.questions.append(question)
-            
+
+        # Convert the stored quiz to a Quiz object, keeping only valid
+        # questions, once per saved version of the quiz
+        cache_key = (quiz_data.id, quiz_data.updated_at)
+        quiz = _preview_quiz_cache.get(cache_key)
+        if quiz is None:
+            quiz = Quiz.from_dict({"type": quiz_data.type, "questions": quiz_data.questions})
+            quiz.questions = [q for q in quiz.questions if q.validate()]
+            _preview_quiz_cache.set(cache_key, quiz)
+
         # Display the quiz using our existing preview function
         if quiz.questions:
             display_student_preview(quiz)
@@ -107,7 +100,7 @@ async def course_detail_page(course_id: str):
             description = st.text_area("Course Description", value=course.description)
             learning_outcomes = st.text_area(
                 "Learning Outcomes (One per line)",
-                value="\n".join(course.learning_outcomes),
+                value=course.joined_learning_outcomes,
                 height=150
             )
             duration = st.number_input(
@@ -142,8 +135,8 @@ async def course_detail_page(course_id: str):
         st.write(course.description)
         
         st.markdown("### Learning Outcomes")
-        for outcome in course.learning_outcomes:
-            st.markdown(f"- {outcome}")
+        # One element for the whole list rather than one per item
+        st.markdown("\n".join(f"- {outcome}" for outcome in course.learning_outcomes))
         
         st.markdown(f"**Duration:** {course.duration} hours")
         st.markdown("### Target Audience")
@@ -156,40 +149,67 @@ async def course_detail_page(course_id: str):
     if len(course.outline_sections) == 0:
         st.info("No outline sections created yet.")
         
-        # Add generate outline button
-        if st.button("🎯 Generate Course Outline"):
+        # Outline generation runs on the database loop, which keeps running
+        # between reruns, so the page stays usable meanwhile
+        outline_tasks = st.session_state.setdefault("outline_tasks", {})
+        task = outline_tasks.get(course_id)
+        if task is None:
+            # Add generate outline button
+            if st.button("🎯 Generate Course Outline"):
+                outline_tasks[course_id] = submit_to_db_loop(IntelligenceHandler.generate_outline(course_id))
+                st.rerun()
+        elif not task.done():
+            st.info("Generating course outline in the background...")
+            if st.button("Check Progress"):
+                st.rerun()
+        else:
+            del outline_tasks[course_id]
             try:
-                with st.spinner("Generating course outline..."):
-                    sections = await IntelligenceHandler.generate_outline(course_id)
-                    # Save the generated sections
-                    for section in sections:
-                        section.course_id = course_id
-                        await section.save()
+                # Save the generated sections in one bulk insert
+                await CourseCreateHandler.set_course_outline(
+                    course_id, CourseCreateHandler.outline_to_dicts(task.result())
+                )
                 st.success("Course outline generated successfully!")
                 st.rerun()
             except Exception as e:
                 st.error(f"Error generating course outline: {str(e)}")
         return
 
-    sections = course.outline_sections
-    sections = sorted(sections, key=lambda x: x.order)
+    # Already in outline order from get_course
+    sections = list(course.outline_sections)
 
     for i, section in enumerate(sections):
-        with st.expander(f"Section {i+1}: {section.title}", expanded=st.session_state.editing_section == i):
-            if st.session_state.editing_mode:
+        is_editing = st.session_state.editing_section == i
+        with st.expander(f"Section {i+1}: {section.title}", expanded=is_editing):
+            if st.session_state.editing_mode and not is_editing:
+                # Only one section's form is built at a time
+                if st.button("Edit Section", key=f"edit_section_{section.id}"):
+                    st.session_state.editing_section = i
+                    st.rerun()
+            elif st.session_state.editing_mode:
+                # Step between sections without closing the editor
+                prev_col, next_col = st.columns([1, 1])
+                with prev_col:
+                    if i > 0 and st.button("← Previous Section", key=f"prev_section_{section.id}"):
+                        st.session_state.editing_section = i - 1
+                        st.rerun()
+                with next_col:
+                    if i < len(sections) - 1 and st.button("Next Section →", key=f"next_section_{section.id}"):
+                        st.session_state.editing_section = i + 1
+                        st.rerun()
+
                 # Edit section details
                 with st.form(f"section_{i}_form"):
                     title = st.text_input("Title", section.title)
                     description = st.text_area("Description", section.description)
-                    type_options = list(LessonType)
                     section_type = section.type if isinstance(section.type, LessonType) else LessonType(section.type)
                     lesson_type = st.selectbox(
                         "Type",
-                        options=type_options,
-                        index=type_options.index(section_type)
+                        options=LESSON_TYPES,
+                        index=LESSON_TYPE_INDEX[section_type]
                     )
                     duration = st.number_input("Duration (minutes)", value=section.duration)
-                    topics = st.text_area("Topics (One per line)", value="\n".join(section.topics))
+                    topics = st.text_area("Topics (One per line)", value=section.joined_topics)
                     
                     if st.form_submit_button("Save Section"):
                         try:
@@ -206,8 +226,13 @@ async def course_detail_page(course_id: str):
                         except Exception as e:
                             st.error(f"Error updating section: {str(e)}")
             else:
-                # View section details
-                await display_section(section)
+                # View section details, built only for sections opened here
+                expanded_sections = st.session_state.expanded_sections
+                if st.toggle("Show Details", value=section.id in expanded_sections, key=f"details_{section.id}"):
+                    expanded_sections.add(section.id)
+                    await display_section(section)
+                else:
+                    expanded_sections.discard(section.id)
             
             # Section content editor
             st.markdown("#### Section Content")
@@ -237,16 +262,20 @@ async def display_section(section: OutlineSection):
         st.write(f"**Description:** {section.description}")
         st.write(f"**Duration:** {section.duration} minutes")
         st.write("**Topics:**")
-        for topic in section.topics:
-            st.write(f"- {topic}")
+        st.markdown("\n".join(f"- {topic}" for topic in section.topics))
             
         if section.type == LessonType.QUIZ:
             if section.linked_sections:
                 st.write("**Tests knowledge from:**")
-                for linked_id in section.linked_sections:
-                    linked_section = await OutlineSection.get_or_none(id=linked_id)
-                    if linked_section:
-                        st.write(f"- {linked_section.title}")
+                # One query for all linked titles, listed in the stored order
+                linked_titles = dict(await on_db_loop(OutlineSection.filter(
+                    id__in=section.linked_sections
+                ).values_list("id", "title")))
+                st.markdown("\n".join(
+                    f"- {linked_titles[linked_id]}"
+                    for linked_id in section.linked_sections
+                    if linked_id in linked_titles
+                ))
     with col2:
         col1, col2 = st.columns([1, 1])
         with col1:
@@ -257,21 +286,22 @@ async def display_section(section: OutlineSection):
                 st.rerun()
         with col2:
             if st.button("Delete", key=f"delete_{section.id}"):
-                if await section.delete():
-                    st.success("Section deleted successfully!")
-                    st.rerun()
+                await on_db_loop(section.delete())
+                CourseViewHandler.invalidate_course(section.course_id)
+                st.success("Section deleted successfully!")
+                st.rerun()
         
         # Add PPT generation button for content sections
         if section.type == LessonType.CONTENT and section.content and section.content.markdown:
             if st.button("Generate PPT", key=f"ppt_{section.id}"):
                 try:
-                    # Generate PPT
-                    pptx_bytes = generate_ppt_from_markdown(section.content.markdown)
+                    # Generate PPT, reusing the file for unchanged content
+                    pptx_file = generate_ppt_cached(section.content.markdown)
                     
                     # Create download button
                     st.download_button(
                         label="Download PPT",
-                        data=pptx_bytes,
+                        data=pptx_file,
                         file_name=f"{section.title}.pptx",
                         mime="application/vnd.openxmlformats-officedocument.presentationml.presentation"
                     )
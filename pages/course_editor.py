@@ -3,7 +3,7 @@ from typing import Optional, Dict, Any, List
 
 from internal.handlers.course import CourseCreateHandler
 from internal.handlers.intelligence import IntelligenceHandler
-from internal.repository.course import LessonType, OutlineSection
+from internal.repository.course import LessonType, OutlineSection, LESSON_TYPES, LESSON_TYPE_INDEX
 from internal.utils.storage import StorageHandler
 from pages.content_creator_course_list import content_creator_course_list_page
 
@@ -24,6 +24,18 @@ def initialize_session_state():
         st.session_state.course_instance = None
         st.session_state.outline_generated = False
 
+def apply_outline_edits(outline: List[Dict[str, Any]]):
+    """Copy the Step 3 widget values onto the outline section dicts in place."""
+    for i, section in enumerate(outline):
+        section["order"] = i
+        section["title"] = st.session_state.get(f"title_{i}", section["title"])
+        section["description"] = st.session_state.get(f"desc_{i}", section["description"])
+        if f"type_{i}" in st.session_state:
+            section["type"] = st.session_state[f"type_{i}"].value
+        section["duration"] = st.session_state.get(f"duration_{i}", section["duration"])
+        if f"topics_{i}" in st.session_state:
+            section["topics"] = st.session_state[f"topics_{i}"].split("\n")
+
 async def course_editor_page():
     st.title("Course Editor")
     
@@ -47,99 +59,111 @@ async def course_editor_page():
     if st.session_state.wizard_step == 1:
         st.header("Step 1: Basic Details")
         
-        course_title = st.text_input(
-            "Course Title", 
-            value=st.session_state.course_data['title']
-        )
-        course_description = st.text_area(
-            "Course Description",
-            value=st.session_state.course_data['description']
-        )
+        # A form, so typing does not rerun the page until Next is pressed
+        with st.form("step1_form"):
+            course_title = st.text_input(
+                "Course Title", 
+                value=st.session_state.course_data['title']
+            )
+            course_description = st.text_area(
+                "Course Description",
+                value=st.session_state.course_data['description']
+            )
+            
+            col1, col2 = st.columns([1, 4])
+            with col1:
+                next_clicked = st.form_submit_button("Next", type="primary", use_container_width=True)
         
-        col1, col2 = st.columns([1, 4])
-        with col1:
-            if st.button("Next", type="primary", use_container_width=True):
-                if course_title and course_description:
-                    with st.spinner("Creating course..."):
-                        # Create the initial course with basic details
-                        course = await CourseCreateHandler.init_course(course_title, course_description)
-                        if course:
-                            st.session_state.course_instance = course
-                            st.session_state.course_data.update({
-                                'title': course_title,
-                                'description': course_description
-                            })
-                            st.session_state.wizard_step = 2
-                            st.rerun()
-                else:
-                    st.error("Please fill in all required fields")
+        if next_clicked:
+            if course_title and course_description:
+                with st.spinner("Creating course..."):
+                    # Create the initial course with basic details
+                    course = await CourseCreateHandler.init_course(course_title, course_description)
+                    if course:
+                        st.session_state.course_instance = course
+                        st.session_state.course_data.update({
+                            'title': course_title,
+                            'description': course_description
+                        })
+                        st.session_state.wizard_step = 2
+                        st.rerun()
+            else:
+                st.error("Please fill in all required fields")
     
     # Step 2: Learning Outcomes and Details
     elif st.session_state.wizard_step == 2:
         st.header("Step 2: Course Details")
         
-        learning_outcomes = st.text_area(
-            "Learning Outcomes (One per line)",
-            value=st.session_state.course_data.get('learning_outcomes', ''),
-            height=150,
-            help="Enter each learning outcome on a new line"
-        )
-        
-        uploaded_files = st.file_uploader(
-            "Upload Knowledge Graph Documents",
-            accept_multiple_files=True,
-            help="Upload documents to help generate the course outline"
-        )
-        
-        course_duration = st.number_input(
-            "Course Duration (hours)",
-            min_value=0.5,
-            max_value=100.0,
-            value=float(st.session_state.course_data.get('duration', 1.0)),
-            step=0.5
-        )
-        
-        target_audience = st.text_area(
-            "Target Audience Description",
-            value=st.session_state.course_data.get('target_audience', ''),
-            help="Describe who this course is intended for"
-        )
+        # A form, so editing the fields does not rerun the page until a
+        # button is pressed
+        with st.form("step2_form"):
+            learning_outcomes = st.text_area(
+                "Learning Outcomes (One per line)",
+                value=st.session_state.course_data.get('learning_outcomes', ''),
+                height=150,
+                help="Enter each learning outcome on a new line"
+            )
+            
+            uploaded_files = st.file_uploader(
+                "Upload Knowledge Graph Documents",
+                accept_multiple_files=True,
+                help="Upload documents to help generate the course outline"
+            )
+            
+            course_duration = st.number_input(
+                "Course Duration (hours)",
+                min_value=0.5,
+                max_value=100.0,
+                value=float(st.session_state.course_data.get('duration', 1.0)),
+                step=0.5
+            )
+            
+            target_audience = st.text_area(
+                "Target Audience Description",
+                value=st.session_state.course_data.get('target_audience', ''),
+                help="Describe who this course is intended for"
+            )
+            
+            col1, col2 = st.columns([1, 1])
+            with col1:
+                back_clicked = st.form_submit_button("Back", use_container_width=True)
+            with col2:
+                next_clicked = st.form_submit_button("Next", type="primary", use_container_width=True)
         
-        col1, col2 = st.columns([1, 1])
-        with col1:
-            if st.button("Back", use_container_width=True):
-                st.session_state.wizard_step = 1
-                st.rerun()
-        with col2:
-            if st.button("Next", type="primary", use_container_width=True):
-                if learning_outcomes and target_audience:
-                    try:
-                        course = st.session_state.course_instance
-                        course_id = course.id
+        if back_clicked:
+            st.session_state.wizard_step = 1
+            st.rerun()
+        if next_clicked:
+            if learning_outcomes and target_audience:
+                try:
+                    course = st.session_state.course_instance
+                    course_id = course.id
 
-                        await CourseCreateHandler.set_course_details(
-                            course_id,
-                            learning_outcomes,
-                            target_audience,
-                            course_duration
-                        )
+                    await CourseCreateHandler.set_course_details(
+                        course_id,
+                        learning_outcomes,
+                        target_audience,
+                        course_duration
+                    )
 
-                        # Upload knowledge graph documents if any
-                        if uploaded_files:
-                            StorageHandler().save_files(course_id, files=uploaded_files)
+                    # Upload knowledge graph documents if any
+                    if uploaded_files:
+                        StorageHandler().save_files(course_id, files=uploaded_files)
+                        with st.spinner("Indexing uploaded documents..."):
+                            await IntelligenceHandler.prepare_course_index(course_id)
 
-                        st.session_state.course_data.update({
-                            'learning_outcomes': learning_outcomes,
-                            'uploaded_files': uploaded_files,
-                            'duration': course_duration,
-                            'target_audience': target_audience
-                        })
-                        st.session_state.wizard_step = 3
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"Error updating course: {str(e)}")
-                else:
-                    st.error("Please fill in all required fields")
+                    st.session_state.course_data.update({
+                        'learning_outcomes': learning_outcomes,
+                        'uploaded_files': uploaded_files,
+                        'duration': course_duration,
+                        'target_audience': target_audience
+                    })
+                    st.session_state.wizard_step = 3
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Error updating course: {str(e)}")
+            else:
+                st.error("Please fill in all required fields")
     
     # Step 3: Course Outline
     elif st.session_state.wizard_step == 3:
@@ -153,7 +177,8 @@ async def course_editor_page():
                 try:
                     course = st.session_state.course_instance
                     outline: List[OutlineSection] = await IntelligenceHandler.generate_outline(course.id)
-                    st.session_state.course_data['outline'] = outline
+                    # Keep plain dicts in session state rather than ORM instances
+                    st.session_state.course_data['outline'] = CourseCreateHandler.outline_to_dicts(outline)
                     st.session_state.outline_generated = True
                     st.rerun()
                 except Exception as e:
@@ -162,48 +187,35 @@ async def course_editor_page():
         if st.session_state.outline_generated:
             st.write("Generated Outline (you can edit any section):")
             
-            updated_outline = []
+            # The widgets hold the edits under their keys; they are copied onto
+            # the outline sections only when leaving the step
             for i, section in enumerate(st.session_state.course_data['outline']):
-                with st.expander(f"Section {i+1}: {section.title}", expanded=True):
-                    title = st.text_input("Title", section.title, key=f"title_{i}")
-                    description = st.text_area("Description", section.description, key=f"desc_{i}")
-                    type_options = list(LessonType)
-                    # Convert string type to enum if needed
-                    section_type = section.type
-                    if isinstance(section_type, str):
-                        section_type = LessonType(section_type)
-                    type_index = type_options.index(section_type)
-                    lesson_type = st.selectbox(
+                with st.expander(f"Section {i+1}: {st.session_state.get(f'title_{i}', section['title'])}", expanded=True):
+                    st.text_input("Title", section['title'], key=f"title_{i}")
+                    st.text_area("Description", section['description'], key=f"desc_{i}")
+                    # The dicts store the type's value
+                    type_index = LESSON_TYPE_INDEX[LessonType(section['type'])]
+                    st.selectbox(
                         "Type",
-                        options=type_options,
+                        options=LESSON_TYPES,
                         index=type_index,
                         key=f"type_{i}"
                     )
-                    duration = st.number_input("Duration (minutes)", value=section.duration, key=f"duration_{i}")
-                    topics = st.text_area("Topics (One per line)", value="\n".join(section.topics), key=f"topics_{i}")
-                    
-                    updated_outline.append(
-                        OutlineSection(
-                            order=i,
-                            title=title,
-                            description=description,
-                            type=lesson_type,
-                            duration=duration,
-                            topics=topics.split("\n"),
-                        )
-                    )
-            
-            st.session_state.course_data['outline'] = updated_outline
+                    st.number_input("Duration (minutes)", value=section['duration'], key=f"duration_{i}")
+                    st.text_area("Topics (One per line)", value="\n".join(section['topics']), key=f"topics_{i}")
             
             col1, col2 = st.columns([1, 1])
             with col1:
                 if st.button("Back", use_container_width=True):
+                    # Keep the edits, since the widgets are dropped with the step
+                    apply_outline_edits(st.session_state.course_data['outline'])
                     st.session_state.wizard_step = 2
                     st.rerun()
             with col2:
                 if st.button("Create Course", type="primary", use_container_width=True):
                     try:
                         course = st.session_state.course_instance
+                        apply_outline_edits(st.session_state.course_data['outline'])
                         
                         # Update the course outline
                         await CourseCreateHandler.set_course_outline(course.id, st.session_state.course_data['outline'])
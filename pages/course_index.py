@@ -24,29 +24,33 @@ async def course_index_page():
             
         # Get course progress
         course_id = int(course.id)
-        progress = await StudentProgressHandler.get_course_progress(course_id)
+        section_statuses = await StudentProgressHandler.get_section_statuses(course_id)
         
         # Course Header
         st.header(course.title)
         st.write(course.description)
         
         # Progress tracking
-        sections = sorted(course.outline_sections, key=lambda x: x.order)
+        # Already in outline order from get_course
+        sections = list(course.outline_sections)
         if not sections:
             st.info("This course has no content yet.")
             return
             
-        completed_sections = sum(1 for section in sections 
-                               if progress.section_status.get(str(section.id)) == SectionStatus.COMPLETED.value)
+        # Look up each section's status once, for both the count and the list
+        section_ids = [str(section.id) for section in sections]
+        statuses = [section_statuses.get(section_id, SectionStatus.NOT_STARTED) for section_id in section_ids]
+        completed_sections = statuses.count(SectionStatus.COMPLETED)
         progress_value = completed_sections / len(sections)
         st.progress(progress_value)
         st.write(f"Progress: {completed_sections}/{len(sections)} sections completed")
         
+        # Fetch the attempts for every quiz section in one query before rendering
+        quiz_attempts = await StudentProgressHandler.get_quiz_histories(course_id)
+        
         # Display sections
         st.markdown("## Course Sections")
-        for i, section in enumerate(sections):
-            section_id = str(section.id)
-            status = progress.section_status.get(section_id, SectionStatus.NOT_STARTED.value)
+        for i, (section, section_id, status) in enumerate(zip(sections, section_ids, statuses)):
             
             # Create a container for each section
             with st.container():
@@ -54,13 +58,13 @@ async def course_index_page():
                 
                 with col1:
                     # Show section title with status indicator
-                    status_emoji = "✅" if status == SectionStatus.COMPLETED.value else "🔄" if status == SectionStatus.IN_PROGRESS.value else "⏳"
+                    status_emoji = "✅" if status == SectionStatus.COMPLETED else "🔄" if status == SectionStatus.IN_PROGRESS else "⏳"
                     st.markdown(f"### {status_emoji} Section {i + 1}: {section.title}")
                     st.write(section.description)
                     
                     # If it's a quiz section, show attempts
                     if section.type == LessonType.QUIZ:
-                        _, attempts = await StudentProgressHandler.get_section_progress(course_id, section_id)
+                        attempts = quiz_attempts.get(section_id)
                         if attempts:
                             st.markdown("**Previous Attempts:**")
                             for j, attempt in enumerate(attempts, 1):
@@ -6,6 +6,10 @@ from internal.handlers.course import CourseViewHandler
 async def course_list_page():
     st.title("Available Courses")
     
+    # The listing is cached by the handler; let students pick up new courses
+    if st.button("Refresh"):
+        CourseViewHandler.invalidate_course_list()
+    
     try:
         # Fetch all courses from the API using the shared event loop
         courses = await CourseViewHandler.list_courses()
@@ -21,11 +25,10 @@ async def course_list_page():
             with (col1 if i % 2 == 0 else col2):
                 with st.container():
                     st.subheader(course.title)
-                    st.write(course.description)
-                    st.write(f"Duration: {course.duration or 'N/A'} hours")
+                    st.markdown(f"{course.description}\n\nDuration: {course.duration or 'N/A'} hours")
                     # TODO: Add progress tracking
                     st.progress(0)  # Placeholder for progress
-                    if st.button("View Course", key=f"view_{i}"):
+                    if st.button("View Course", key=f"view_{course.id}"):
                         # Store course ID and navigate to course index
                         st.session_state.selected_course_id = str(course.id)
                         st.session_state.current_page = "course_index"
@@ -2,6 +2,20 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 
+@st.cache_data(show_spinner=False)
+def load_progress_data() -> pd.DataFrame:
+    """Progress over time (sample data; key on course and updated_at once real)."""
+    return pd.DataFrame({
+        'Date': pd.date_range(start='2024-01-01', periods=10, freq='W'),
+        'Completed Courses': range(1, 11),
+        'Learning Hours': [5, 8, 12, 15, 20, 22, 25, 28, 30, 35]
+    })
+
+@st.cache_resource(show_spinner=False)
+def build_progress_figure():
+    """Build the progress chart once and share it; it is only read when drawn."""
+    return px.line(load_progress_data(), x='Date', y=['Completed Courses', 'Learning Hours'])
+
 async def metrics_page():
     st.title("Learning Metrics")
     
@@ -22,14 +36,7 @@ async def metrics_page():
     
     # Progress over time chart
     st.subheader("Learning Progress Over Time")
-    progress_data = pd.DataFrame({
-        'Date': pd.date_range(start='2024-01-01', periods=10, freq='W'),
-        'Completed Courses': range(1, 11),
-        'Learning Hours': [5, 8, 12, 15, 20, 22, 25, 28, 30, 35]
-    })
-    
-    fig = px.line(progress_data, x='Date', y=['Completed Courses', 'Learning Hours'])
-    st.plotly_chart(fig)
+    st.plotly_chart(build_progress_figure())
     
     # Recent activity
     st.subheader("Recent Activity")
@@ -1,35 +1,46 @@
 import streamlit as st
 from typing import Optional, Tuple, List, Dict, Any
 from internal.repository.course import Quiz as QuizModel, QuizType
-from internal.custom_types.quiz import Quiz, MultipleChoiceQuestion, FillInBlankQuestion, BaseQuestion
+from internal.custom_types.quiz import Quiz, MultipleChoiceQuestion, FillInBlankQuestion, BaseQuestion, split_blank
 from internal.handlers.intelligence import IntelligenceHandler
 from internal.handlers.section import SectionViewHandler
 import json
 
-def create_multiple_choice_question() -> Optional[MultipleChoiceQuestion]:
-    question = st.text_area("Question")
-    options = []
-    correct_answer = None
+def create_multiple_choice_question():
+    """Render the multiple choice fields; build_multiple_choice_question reads them on submit."""
+    st.text_area("Question", key="mcq_question")
     
     col1, col2 = st.columns([3, 1])
     with col1:
         # Add options
         for i in range(4):  # Default 4 options
-            option = st.text_input(f"Option {i + 1}")
-            if option:
-                options.append(option)
+            st.text_input(f"Option {i + 1}", key=f"mcq_opt_{i}")
     
     with col2:
-        if options:
-            correct_answer = st.selectbox(
-                "Correct Answer",
-                options=range(len(options)),
-                format_func=lambda x: f"Option {x + 1}"
-            )
+        st.selectbox(
+            "Correct Answer",
+            options=range(4),
+            format_func=lambda x: f"Option {x + 1}",
+            key="mcq_correct"
+        )
+    
+    st.text_area("Justification (Explain why this is the correct answer)", key="mcq_justification")
+
+def build_multiple_choice_question() -> Optional[MultipleChoiceQuestion]:
+    """Build the submitted multiple choice question, or None if it is incomplete."""
+    question = st.session_state.mcq_question
+    justification = st.session_state.mcq_justification
+    raw_options = [st.session_state[f"mcq_opt_{i}"] for i in range(4)]
+    options = [option for option in raw_options if option]
     
-    justification = st.text_area("Justification (Explain why this is the correct answer)")
+    # The correct answer must be a filled-in option; blank options are
+    # dropped, so map its position onto the remaining ones
+    correct = st.session_state.mcq_correct
+    if not raw_options[correct]:
+        return None
+    correct_answer = sum(1 for option in raw_options[:correct] if option)
     
-    if question and options and correct_answer is not None and justification:
+    if question and options and justification:
         question_obj = MultipleChoiceQuestion(
             question=question,
             options=options,
@@ -39,21 +50,28 @@ def create_multiple_choice_question() -> Optional[MultipleChoiceQuestion]:
         return question_obj if question_obj.validate() else None
     return None
 
-def create_fill_in_blank_question() -> Optional[FillInBlankQuestion]:
+def create_fill_in_blank_question():
+    """Render the fill in the blank fields; build_fill_in_blank_question reads them on submit."""
     st.info("Enter your question and use '_____' (five underscores) where you want the blank to appear. Example: 'The capital of France is _____.'")
-    question = st.text_area("Question")
-    correct_answer = st.text_input("Correct Answer")
-    justification = st.text_area("Justification (Explain why this is the correct answer)")
+    question = st.text_area("Question", key="fib_question")
+    st.text_input("Correct Answer", key="fib_answer")
+    st.text_area("Justification (Explain why this is the correct answer)", key="fib_justification")
     
-    # Show a preview of how the question will look
+    # Show a preview of how the last submitted question looks
     if question:
         st.write("Preview:")
-        parts = question.split("_____")
-        if len(parts) != 2:
+        parts = split_blank(question)
+        if parts is None:
             st.error("Your question must contain exactly one '_____' (five underscores) to mark where the blank should appear.")
         else:
             st.write(parts[0] + "________" + parts[1])
             st.write("\nAnswer options will be shown from a pool of all answers in the quiz.")
+
+def build_fill_in_blank_question() -> Optional[FillInBlankQuestion]:
+    """Build the submitted fill in the blank question, or None if it is incomplete."""
+    question = st.session_state.fib_question
+    correct_answer = st.session_state.fib_answer
+    justification = st.session_state.fib_justification
     
     if question and correct_answer and justification:
         question_obj = FillInBlankQuestion(
@@ -84,8 +102,12 @@ def display_questions(quiz: Quiz):
         st.write("Justification:", q.justification)
         st.divider()
 
-def display_ai_generated_question(question: Dict[str, Any], quiz_type: QuizType) -> Optional[BaseQuestion]:
-    """Display an AI generated question as a card and return it if selected."""
+def display_ai_generated_question(index: int, question: Dict[str, Any], quiz_type: QuizType) -> Optional[BaseQuestion]:
+    """Display an AI generated question as a card and return it if selected.
+
+    The index is the question's position in the generated list and keys
+    its Add button.
+    """
     with st.container():
         st.markdown("---")
         col1, col2 = st.columns([5, 1])
@@ -105,51 +127,38 @@ def display_ai_generated_question(question: Dict[str, Any], quiz_type: QuizType)
                 st.write(question["justification"])
         
         with col2:
-            # Create the appropriate question object based on type
-            if quiz_type == QuizType.MULTIPLE_CHOICE:
-                new_question = MultipleChoiceQuestion(
-                    question=question["question"],
-                    options=question["options"],
-                    correct_answer=question["correct_answer"],
-                    justification=question["justification"]
-                )
-            else:
-                new_question = FillInBlankQuestion(
-                    question=question["question"],
-                    correct_answer=question["correct_answer"],
-                    justification=question["justification"]
-                )
-                
-            if st.button("Add", key=f"add_{hash(question['question'])}"):
-                return new_question
+            if st.button("Add", key=f"add_ai_{index}"):
+                # Create the appropriate question object based on type
+                if quiz_type == QuizType.MULTIPLE_CHOICE:
+                    return MultipleChoiceQuestion.from_dict(question)
+                return FillInBlankQuestion.from_dict(question)
     
     return None
 
-def display_student_preview(quiz: Quiz):
-    """Display the quiz as it will appear to students."""
-    st.markdown("""
-        <style>
-        .quiz-preview {
-            border: 1px solid #ddd;
-            padding: 20px;
-            border-radius: 10px;
-            background-color: #f8f9fa;
-        }
-        .fill-blank-container {
-            display: inline;
-            margin: 0 10px;
-        }
-        </style>
-    """, unsafe_allow_html=True)
-    
+def refresh_answer_pool():
+    """Recompute the fill-in-the-blank answer pool of the quiz being edited.
+
+    Call after every change to st.session_state.quiz.questions, so the
+    preview does not rebuild the pool on each rerun.
+    """
+    st.session_state.answer_pool = [
+        q.correct_answer for q in st.session_state.quiz.questions
+        if isinstance(q, FillInBlankQuestion)
+    ]
+
+def display_student_preview(quiz: Quiz, answer_pool: Optional[List[str]] = None):
+    """Display the quiz as it will appear to students.
+
+    Pass answer_pool when it is already known; otherwise it is built from
+    the quiz's fill-in-the-blank answers.
+    """
     # Create a pool of all possible answers for fill in the blank questions
-    answer_pool = []
-    for q in quiz.questions:
-        if isinstance(q, FillInBlankQuestion):
-            answer_pool.append(q.correct_answer)
+    if answer_pool is None:
+        answer_pool = [q.correct_answer for q in quiz.questions if isinstance(q, FillInBlankQuestion)]
     
-    with st.container():
-        st.markdown('<div class="quiz-preview">', unsafe_allow_html=True)
+    # A bordered container draws the preview frame; separate markdown calls
+    # cannot open and close an HTML wrapper around other elements
+    with st.container(border=True):
         for i, q in enumerate(quiz.questions):
             st.subheader(f"Question {i + 1}")
             
@@ -171,9 +180,9 @@ def display_student_preview(quiz: Quiz):
                         st.error(f"Incorrect. The correct answer is: {q.options[q.correct_answer]}\n\n{q.justification}")
                 
             else:  # FillInBlankQuestion
-                # Split question at the blank marker
-                parts = q.question.split("_____")
-                if len(parts) == 2:
+                # Split once when the question was built
+                parts = q.parts
+                if parts is not None:
                     # Display the question with the blank
                     st.write(parts[0] + "_____" + parts[1])
                     
@@ -195,7 +204,6 @@ def display_student_preview(quiz: Quiz):
                     st.error(f"Question {i + 1} is not properly formatted. Please contact your instructor.")
             
             st.markdown("---")
-        st.markdown('</div>', unsafe_allow_html=True)
 
 def manage_quiz_questions(quiz: Quiz):
     """Display and manage current quiz questions."""
@@ -228,12 +236,32 @@ def manage_quiz_questions(quiz: Quiz):
     
     # Process deletions after the loop to avoid index issues
     if questions_to_delete:
-        # Delete questions in reverse order to maintain correct indices
-        for index in sorted(questions_to_delete, reverse=True):
-            quiz.questions.pop(index)
+        # Keep the other questions in one pass rather than popping each index
+        delete_set = set(questions_to_delete)
+        quiz.questions[:] = [q for i, q in enumerate(quiz.questions) if i not in delete_set]
         st.success("Question(s) removed!")
         # No need to call rerun as Streamlit will handle the state update
 
+@st.fragment
+def student_preview_fragment():
+    """Student preview of the quiz being edited.
+
+    Answer picks and Check Answer clicks rerun only this fragment. It reads
+    the quiz from session state so a fragment rerun sees the current one.
+    """
+    display_student_preview(st.session_state.quiz, st.session_state.answer_pool)
+
+@st.fragment
+def manage_questions_fragment():
+    """Question list of the quiz being edited; removals rerun only this fragment."""
+    quiz = st.session_state.quiz
+    count = len(quiz.questions)
+    manage_quiz_questions(quiz)
+    if len(quiz.questions) != count:
+        refresh_answer_pool()
+        # Redraw the list without the removed questions
+        st.rerun(scope="fragment")
+
 async def quiz_editor_page(course_id: str, section_id: str):
     st.title("Quiz Editor")
     
@@ -245,6 +273,9 @@ async def quiz_editor_page(course_id: str, section_id: str):
         )
         st.session_state.quiz_loaded = False  # Add a flag to track if quiz has been loaded
     
+    if "answer_pool" not in st.session_state:
+        refresh_answer_pool()
+    
     if "ai_generated_questions" not in st.session_state:
         st.session_state.ai_generated_questions = []
     
@@ -260,32 +291,15 @@ async def quiz_editor_page(course_id: str, section_id: str):
         if section.quiz and not st.session_state.quiz_loaded:  # Check the loaded flag instead of questions
             quiz_data = await section.quiz  # Await the quiz relationship
             
-            # Convert database quiz to our Quiz object
-            st.session_state.quiz = Quiz(
-                type=QuizType(quiz_data.type.value if hasattr(quiz_data.type, 'value') else quiz_data.type),
-                questions=[]
-            )
-            
-            # Convert stored questions to appropriate objects
+            # Convert database quiz to our Quiz object, keeping only valid questions
             stored_questions = quiz_data.questions
-            if isinstance(stored_questions, (list, tuple)):
-                for q in stored_questions:
-                    if quiz_data.type in [QuizType.MULTIPLE_CHOICE, "multiple_choice"]:
-                        question = MultipleChoiceQuestion(
-                            question=q["question"],
-                            options=q["options"],
-                            correct_answer=q["correct_answer"],
-                            justification=q["justification"]
-                        )
-                    else:
-                        question = FillInBlankQuestion(
-                            question=q["question"],
-                            correct_answer=q["correct_answer"],
-                            justification=q["justification"]
-                        )
-                    if question.validate():
-                        st.session_state.quiz.questions.append(question)
-            
+            if not isinstance(stored_questions, (list, tuple)):
+                stored_questions = []
+            quiz = Quiz.from_dict({"type": quiz_data.type, "questions": stored_questions})
+            quiz.questions = [q for q in quiz.questions if q.validate()]
+            st.session_state.quiz = quiz
+            refresh_answer_pool()
+
             st.session_state.quiz_loaded = True  # Mark the quiz as loaded
     except ValueError as e:
         st.error(f"Error loading section: {str(e)}")
@@ -303,8 +317,11 @@ async def quiz_editor_page(course_id: str, section_id: str):
     
     # Update quiz type if changed
     if quiz_type != st.session_state.quiz.type:
-        st.session_state.quiz = Quiz(type=quiz_type, questions=[])
-        st.session_state.ai_generated_questions = []
+        # Reset the existing quiz in place rather than building a new one
+        st.session_state.quiz.type = quiz_type
+        st.session_state.quiz.questions.clear()
+        st.session_state.answer_pool.clear()
+        st.session_state.ai_generated_questions.clear()
         st.rerun()
 
     # Create tabs for different sections
@@ -319,13 +336,19 @@ async def quiz_editor_page(course_id: str, section_id: str):
         st.header("Create Questions Manually")
         with st.form("new_question"):
             if quiz_type == QuizType.MULTIPLE_CHOICE:
-                new_question = create_multiple_choice_question()
+                create_multiple_choice_question()
             else:
-                new_question = create_fill_in_blank_question()
+                create_fill_in_blank_question()
                 
             if st.form_submit_button("Add Question"):
+                # Read the fields and build the question only on submit
+                if quiz_type == QuizType.MULTIPLE_CHOICE:
+                    new_question = build_multiple_choice_question()
+                else:
+                    new_question = build_fill_in_blank_question()
                 if new_question and new_question.validate():
                     st.session_state.quiz.questions.append(new_question)
+                    refresh_answer_pool()
                     st.success("Question added successfully!")
                 else:
                     st.error("Please fill in all required fields correctly")
@@ -359,26 +382,27 @@ async def quiz_editor_page(course_id: str, section_id: str):
             st.subheader("AI Generated Questions")
             st.write("Review and select questions to add to your quiz:")
             
-            for question in st.session_state.ai_generated_questions:
-                added_question = display_ai_generated_question(question, quiz_type)
+            for i, question in enumerate(st.session_state.ai_generated_questions):
+                added_question = display_ai_generated_question(i, question, quiz_type)
                 if added_question:
                     st.session_state.quiz.questions.append(added_question)
+                    refresh_answer_pool()
                     st.success("Question added to quiz!")
-                    st.session_state.ai_generated_questions.remove(question)
+                    st.session_state.ai_generated_questions.pop(i)
                     st.rerun()
     
     with preview_tab:
         st.header("Student Preview")
         st.write("This is how students will see the quiz:")
         if st.session_state.quiz.questions:
-            display_student_preview(st.session_state.quiz)
+            student_preview_fragment()
         else:
             st.info("Add some questions to see how the quiz will look to students.")
     
     with manage_tab:
         st.header("Manage Quiz Questions")
         if st.session_state.quiz.questions:
-            manage_quiz_questions(st.session_state.quiz)
+            manage_questions_fragment()
             
             col1, col2 = st.columns([1, 4])
             with col1:
@@ -386,38 +410,15 @@ async def quiz_editor_page(course_id: str, section_id: str):
                     if st.session_state.quiz.validate():
                         try:
                             # Convert quiz to database format
-                            quiz_data = {
-                                "type": st.session_state.quiz.type.value,
-                                "questions": [q.to_dict() for q in st.session_state.quiz.questions]
-                            }
+                            quiz_data = st.session_state.quiz.to_dict()
                             
                             # Create or update quiz in database
-                            if section.quiz:
-                                # Get the actual quiz instance
-                                quiz_instance = await section.quiz
-                                if quiz_instance:
-                                    # Update existing quiz
-                                    quiz_instance.type = st.session_state.quiz.type.value  # Use .value here
-                                    quiz_instance.questions = quiz_data["questions"]
-                                    await quiz_instance.save()
-                                else:
-                                    # Create new quiz if relation exists but instance doesn't
-                                    quiz = await QuizModel.create(
-                                        type=st.session_state.quiz.type.value,  # Use .value here
-                                        questions=quiz_data["questions"]
-                                    )
-                                    section.quiz = quiz
-                                    await section.save()
-                            else:
-                                # Create new quiz
-                                quiz = await QuizModel.create(
-                                    type=st.session_state.quiz.type.value,  # Use .value here
-                                    questions=quiz_data["questions"]
-                                )
-                                # Link quiz to section
-                                section.quiz = quiz
-                                await section.save()
-                            
+                            await SectionViewHandler.save_section_quiz(
+                                section,
+                                st.session_state.quiz.type.value,
+                                quiz_data["questions"]
+                            )
+
                             st.success("Quiz saved successfully!")
                         except Exception as e:
                             st.error(f"Error saving quiz: {str(e)}")
@@ -430,6 +431,7 @@ async def quiz_editor_page(course_id: str, section_id: str):
             with col2:
                 if st.button("Clear All Questions"):
                     st.session_state.quiz.questions = []
+                    st.session_state.answer_pool = []
                     st.session_state.ai_generated_questions = []
                     st.rerun()
         else:
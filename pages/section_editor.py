@@ -1,22 +1,27 @@
-import pdb
-
 import streamlit as st
 from typing import Optional, List
 
 from internal.handlers.intelligence import IntelligenceHandler
 from internal.handlers.section import SectionViewHandler
-from internal.repository.course import LessonType, OutlineSection
+from internal.repository.course import Course, LessonType, OutlineSection
 from pages.quiz_editor import quiz_editor_page
 
-async def get_linkable_sections(course: OutlineSection, current_section: OutlineSection) -> List[OutlineSection]:
+def get_linkable_sections(course: Course, current_section: OutlineSection) -> List[OutlineSection]:
     """Get all content sections that can be linked to the current quiz section."""
-    linkable_sections = []
-    for section in course.outline_sections:
-        # Only include content sections that come before this quiz
-        if (section.type == LessonType.CONTENT and 
-            section.order < current_section.order):
-            linkable_sections.append(section)
-    return linkable_sections
+    # Only include content sections that come before this quiz; the cached
+    # course's sections are already in outline order
+    return [
+        s for s in course.outline_sections
+        if s.type == LessonType.CONTENT and s.order < current_section.order
+    ]
+
+@st.fragment
+def content_preview(markdown: str):
+    """Markdown preview; toggling it reruns only this fragment, not the page."""
+    if st.checkbox("Show Preview", value=True):
+        st.markdown("---")
+        st.markdown("### Preview")
+        st.markdown(markdown)
 
 async def section_editor_page(course_id: str, section_id: str):
     try:
@@ -45,19 +50,19 @@ async def section_editor_page(course_id: str, section_id: str):
             st.markdown(f"**Type:** {section.type.value}")
             st.markdown(f"**Duration:** {section.duration} minutes")
             st.markdown("**Topics to Cover:**")
-            for topic in section.topics:
-                st.markdown(f"- {topic}")
+            # One element for the whole list rather than one per item
+            st.markdown("\n".join(f"- {topic}" for topic in section.topics))
             
             # Add linked sections display in sidebar for quiz sections
             if section.type == LessonType.QUIZ and section.linked_sections:
                 st.markdown("---")
                 st.markdown("### Linked Sections")
-                for linked_id in section.linked_sections:
-                    try:
-                        _, linked_section = await SectionViewHandler.get_section_with_content(course_id, str(linked_id))
-                        st.markdown(f"- {linked_section.title}")
-                    except ValueError:
-                        st.markdown(f"- Unknown section ({linked_id})")
+                linked_titles = {s.id: s.title for s in course.outline_sections}
+                st.markdown("\n".join(
+                    f"- {linked_titles[linked_id]}" if linked_id in linked_titles
+                    else f"- Unknown section ({linked_id})"
+                    for linked_id in section.linked_sections
+                ))
         
         # Main content area
         st.title(f"Editing: {section.title}")
@@ -68,7 +73,7 @@ async def section_editor_page(course_id: str, section_id: str):
             st.write("Select the content sections this quiz will test knowledge from:")
             
             # Get linkable sections
-            linkable_sections = await get_linkable_sections(course, section)
+            linkable_sections = get_linkable_sections(course, section)
             
             if not linkable_sections:
                 st.warning("No content sections available to link. Add some content sections before this quiz.")
@@ -91,8 +96,9 @@ async def section_editor_page(course_id: str, section_id: str):
                 if st.button("Save Linked Sections"):
                     try:
                         # Convert selected section IDs to integers
-                        section.linked_sections = [int(s_id) for s_id in selected_sections]
-                        await section.save()
+                        await SectionViewHandler.update_linked_sections(
+                            section, [int(s_id) for s_id in selected_sections]
+                        )
                         st.success("Linked sections updated successfully!")
                     except Exception as e:
                         st.error(f"Error saving linked sections: {str(e)}")
@@ -133,10 +139,7 @@ async def section_editor_page(course_id: str, section_id: str):
                         st.error(f"Error saving content: {str(e)}")
 
             # Preview section
-            if st.checkbox("Show Preview", value=True):
-                st.markdown("---")
-                st.markdown("### Preview")
-                st.markdown(new_content)
+            content_preview(new_content)
 
     except ValueError as e:
         st.error(str(e))
@@ -1,16 +1,18 @@
+import asyncio
+
 import streamlit as st
 from internal.handlers.course import CourseViewHandler
 from internal.repository.course import LessonType
 from internal.handlers.student_progress import StudentProgressHandler
 from internal.repository.student_progress import SectionStatus
-from internal.handlers.intelligence import IntelligenceHandler
+from internal.utils.db import submit_to_db_loop
+from pages.chat import initialize_chatbots, get_section_chatbot, write_chatbot_reply
 
 async def initialize_chat():
     """Initialize chat-related session state variables."""
     if 'messages' not in st.session_state:
         st.session_state.messages = []
-    if 'chatbot_agent' not in st.session_state:
-        st.session_state.chatbot_agent = None
+    initialize_chatbots()
 
 async def display_chat_interface(course_id: int, section_id: str):
     """Display the chat interface in the sidebar."""
@@ -18,43 +20,47 @@ async def display_chat_interface(course_id: int, section_id: str):
         st.title("Course Assistant")
         st.markdown("Ask questions about the course content and get helpful answers!")
 
-        # Create containers for chat components
-        chat_container = st.container()
-        input_container = st.container()
+        # Returning to a section reuses the chatbot built on the first visit
+        chatbot_agent, sys_prompt = await get_section_chatbot(course_id, section_id, "Initializing course assistant...")
 
-        # Initialize chatbot if not already done
-        if st.session_state.chatbot_agent is None:
-            with st.spinner("Initializing course assistant..."):
-                st.session_state.chatbot_agent, st.session_state.sys_prompt = await IntelligenceHandler.get_course_chatbot(str(course_id), section_id)
+        chat_panel(chatbot_agent, sys_prompt)
 
-        # Chat input (placed first in code but will appear at bottom)
-        with input_container:
-            prompt = st.chat_input("Ask a question about the course")
+@st.fragment
+def chat_panel(chatbot_agent, sys_prompt: str):
+    """Display the chat history and input for a section's chatbot.
 
-        # Display chat messages in the container
-        with chat_container:
-            for message in st.session_state.messages:
-                with st.chat_message(message["role"]):
-                    st.markdown(message["content"])
+    A fragment, so sending a message reruns only the chat, not the page.
+    """
 
-        # Handle new messages
-        if prompt:
-            # Add user message to chat history
-            st.session_state.messages.append({"role": "user", "content": prompt})
-            
-            # Display user message
-            with chat_container:
-                with st.chat_message("user"):
-                    st.markdown(prompt)
+    # Create containers for chat components
+    chat_container = st.container()
+    input_container = st.container()
+
+    # Chat input (placed first in code but will appear at bottom)
+    with input_container:
+        prompt = st.chat_input("Ask a question about the course")
+
+    # Display chat messages in the container
+    with chat_container:
+        for message in st.session_state.messages:
+            with st.chat_message(message["role"]):
+                st.markdown(message["content"])
+
+    # Handle new messages
+    if prompt:
+        # Add user message to chat history
+        st.session_state.messages.append({"role": "user", "content": prompt})
+        
+        # Display user message
+        with chat_container:
+            with st.chat_message("user"):
+                st.markdown(prompt)
 
-            # Get chatbot response
-            with chat_container:
-                with st.chat_message("assistant"):
-                    with st.spinner("Thinking..."):
-                        final_prompt = st.session_state.sys_prompt + "\n\n" + prompt
-                        response = st.session_state.chatbot_agent.run(final_prompt)
-                        st.markdown(response)
-                        st.session_state.messages.append({"role": "assistant", "content": response})
+        # Get chatbot response
+        with chat_container:
+            with st.chat_message("assistant"):
+                response = write_chatbot_reply(chatbot_agent, sys_prompt + "\n\n" + prompt)
+                st.session_state.messages.append({"role": "assistant", "content": response})
 
 async def take_content_page():
     """Handle content viewing functionality."""
@@ -68,8 +74,12 @@ async def take_content_page():
         return
         
     try:
-        # Fetch course data
-        course = await CourseViewHandler.get_course(st.session_state.selected_course_id)
+        # Fetch the course and the student's section statuses together; the
+        # statuses are keyed by section, so they do not wait on the course
+        course, section_statuses = await asyncio.gather(
+            CourseViewHandler.get_course(st.session_state.selected_course_id),
+            StudentProgressHandler.get_section_statuses(st.session_state.selected_course_id)
+        )
         if not course:
             st.error("Course not found")
             st.session_state.current_page = "course_index"
@@ -77,7 +87,8 @@ async def take_content_page():
             return
             
         # Get current section
-        sections = sorted(course.outline_sections, key=lambda x: x.order)
+        # Already in outline order from get_course
+        sections = list(course.outline_sections)
         current_section = sections[st.session_state.current_section_index]
         section_id = str(current_section.id)
         course_id = int(course.id)
@@ -89,11 +100,8 @@ async def take_content_page():
         st.header(current_section.title)
         st.write(current_section.description)
         
-        # Get section progress
-        progress = await StudentProgressHandler.get_section_progress(course_id, section_id)
-        
         # Mark section as in progress if not already completed
-        if progress[0] != SectionStatus.COMPLETED.value:
+        if section_statuses.get(section_id) != SectionStatus.COMPLETED:
             await StudentProgressHandler.start_section(
                 course_id,
                 section_id,
@@ -119,10 +127,14 @@ async def take_content_page():
             if st.session_state.current_section_index < len(sections) - 1:
                 next_section = sections[st.session_state.current_section_index + 1]
                 if st.button("Mark Complete & Continue →", use_container_width=True):
-                    # Mark current section as complete
-                    await StudentProgressHandler.mark_section_complete(
-                        course_id,
-                        section_id
+                    # Mark current section as complete in the background on
+                    # the database loop; main() waits for it at the start of
+                    # the next run
+                    st.session_state.setdefault("pending_progress_writes", []).append(
+                        submit_to_db_loop(StudentProgressHandler.mark_section_complete(
+                            course_id,
+                            section_id
+                        ))
                     )
                     # Move to next section
                     st.session_state.current_section_index += 1
@@ -138,9 +150,9 @@ async def take_content_page():
                     # Mark final section and course as complete
                     await StudentProgressHandler.mark_section_complete(
                         course_id,
-                        section_id
+                        section_id,
+                        complete_course=True
                     )
-                    await StudentProgressHandler.mark_course_completed(course_id)
                     st.success("Congratulations! You've completed the course!")
                     st.session_state.current_page = "course_index"
                     st.rerun()
@@ -1,36 +1,40 @@
+import asyncio
+
 import streamlit as st
 from internal.handlers.course import CourseViewHandler
 from internal.repository.course import QuizType
-from internal.custom_types.quiz import Quiz, MultipleChoiceQuestion, FillInBlankQuestion
 from internal.handlers.student_progress import StudentProgressHandler
 from internal.handlers.intelligence import IntelligenceHandler
-from typing import Tuple, Dict, List, Optional
-from datetime import datetime
+from internal.utils.db import submit_to_db_loop
+from pages.chat import initialize_chatbots, get_section_chatbot, drop_section_chatbot, write_chatbot_reply
+from typing import Tuple, Dict, List
+
+# Stored quizzes carry QuizType members or their raw values; resolve either
+# with one lookup
+_QUIZ_TYPES = {**{t: t for t in QuizType}, **{t.value: t for t in QuizType}}
 
 async def initialize_chat():
     """Initialize chat-related session state variables."""
     # Initialize chat messages if not exists
     if 'quiz_messages' not in st.session_state:
         st.session_state.quiz_messages = {}
+    # Serialized prompt text for each discussion, kept in step with quiz_messages
+    if 'quiz_conversations' not in st.session_state:
+        st.session_state.quiz_conversations = {}
     
-    # Reset chatbot agent if it exists but is in an error state
-    if 'quiz_chatbot_agent' in st.session_state and st.session_state.quiz_chatbot_agent is not None:
-        try:
-            # Test if the agent is still functional
-            test_prompt = "test"
-            st.session_state.quiz_chatbot_agent.run(test_prompt)
-        except Exception:
-            st.session_state.quiz_chatbot_agent = None
-            st.session_state.quiz_sys_prompt = None
+    # A failing agent is dropped by display_chat_interface when one of its
+    # real runs raises, so it is not probed here
     
     # Initialize or reset other chat-related state
-    if 'quiz_chatbot_agent' not in st.session_state:
-        st.session_state.quiz_chatbot_agent = None
-    if 'quiz_sys_prompt' not in st.session_state:
-        st.session_state.quiz_sys_prompt = None
+    initialize_chatbots()
     if 'active_discussion_question' not in st.session_state:
         st.session_state.active_discussion_question = None
 
+def add_quiz_message(question_index: int, role: str, content: str):
+    """Record a discussion message and append it to the serialized conversation."""
+    st.session_state.quiz_messages[question_index].append({"role": role, "content": content})
+    st.session_state.quiz_conversations[question_index] += f"\n{role.upper()}: {content}\n"
+
 async def display_chat_interface(course_id: int, section_id: str, question_index: int, question_data: dict, user_answer: str, quiz_type: QuizType):
     """Display the chat interface in the sidebar for quiz discussion."""
     with st.sidebar:
@@ -41,10 +45,8 @@ async def display_chat_interface(course_id: int, section_id: str, question_index
             st.session_state.quiz_messages[question_index] = []
 
         try:
-            # Initialize chatbot if not already done
-            if st.session_state.quiz_chatbot_agent is None:
-                with st.spinner("Initializing discussion assistant..."):
-                    st.session_state.quiz_chatbot_agent, st.session_state.quiz_sys_prompt = await IntelligenceHandler.get_course_chatbot(str(course_id), section_id)
+            # Later discussions reuse the chatbot built for the first one
+            chatbot_agent, sys_prompt = await get_section_chatbot(course_id, section_id, "Initializing discussion assistant...")
 
             # Format the initial message about the question
             if quiz_type == QuizType.MULTIPLE_CHOICE:
@@ -64,20 +66,17 @@ Explanation: {question_data['justification']}
 
 Please provide a more detailed explanation of why this answer is correct and help me understand the concept better.
 """
-                # Add system message to chat history
-                st.session_state.quiz_messages[question_index].append({"role": "user", "content": initial_prompt})
+                # Start the serialized conversation, then add the opening message
+                st.session_state.quiz_conversations[question_index] = sys_prompt + "\n\nConversation history:\n"
+                add_quiz_message(question_index, "user", initial_prompt)
                 
-                # Get initial response
+                # Get initial response; the history below draws both
+                # messages in this same run
                 with st.spinner("Preparing detailed explanation..."):
-                    # Build the complete conversation history
-                    conversation = st.session_state.quiz_sys_prompt + "\n\nConversation history:\n"
-                    for msg in st.session_state.quiz_messages[question_index]:
-                        conversation += f"\n{msg['role'].upper()}: {msg['content']}\n"
-                    conversation += f"\nASSISTANT: "
+                    conversation = st.session_state.quiz_conversations[question_index] + "\nASSISTANT: "
                     
-                    response = st.session_state.quiz_chatbot_agent.run(conversation)
-                    st.session_state.quiz_messages[question_index].append({"role": "assistant", "content": response})
-                    st.rerun()  # Ensure the new messages are displayed
+                    response = IntelligenceHandler.run_chat_agent(chatbot_agent, conversation)
+                    add_quiz_message(question_index, "assistant", response)
 
             # Display chat messages
             for message in st.session_state.quiz_messages[question_index]:
@@ -87,7 +86,7 @@ Please provide a more detailed explanation of why this answer is correct and hel
             # Chat input
             if prompt := st.chat_input("Ask a follow-up question"):
                 # Add user message to chat history
-                st.session_state.quiz_messages[question_index].append({"role": "user", "content": prompt})
+                add_quiz_message(question_index, "user", prompt)
                 
                 # Display user message
                 with st.chat_message("user"):
@@ -95,17 +94,13 @@ Please provide a more detailed explanation of why this answer is correct and hel
 
                 # Get chatbot response
                 with st.chat_message("assistant"):
-                    with st.spinner("Thinking..."):
-                        # Build the complete conversation history
-                        conversation = st.session_state.quiz_sys_prompt + "\n\nConversation history:\n"
-                        for msg in st.session_state.quiz_messages[question_index]:
-                            conversation += f"\n{msg['role'].upper()}: {msg['content']}\n"
-                        conversation += f"\nASSISTANT: "
-                        
-                        response = st.session_state.quiz_chatbot_agent.run(conversation)
-                        st.markdown(response)
-                        st.session_state.quiz_messages[question_index].append({"role": "assistant", "content": response})
-                        st.rerun()  # Ensure the new messages are displayed
+                    # The history so far is already serialized; only the
+                    # reply cue is added
+                    conversation = st.session_state.quiz_conversations[question_index] + "\nASSISTANT: "
+                    
+                    # Both messages are drawn inline, so no rerun is needed
+                    response = write_chatbot_reply(chatbot_agent, conversation)
+                    add_quiz_message(question_index, "assistant", response)
 
             # Add a close button
             if st.button("Close Discussion", use_container_width=True):
@@ -116,55 +111,43 @@ Please provide a more detailed explanation of why this answer is correct and hel
             st.error(f"Error in chat interface: {str(e)}")
             import traceback
             st.error(f"Traceback: {traceback.format_exc()}")
-            # Reset chat state on error
-            st.session_state.quiz_chatbot_agent = None
+            # Reset chat state on error, so the next discussion builds a new agent
+            drop_section_chatbot(course_id, section_id)
             st.session_state.active_discussion_question = None
 
-def display_question(index: int, question_data: dict, quiz_type: QuizType, show_feedback: bool = False) -> str:
-    """Display a single quiz question and return the answer."""
+@st.fragment
+def display_question(index: int, question_data: dict, quiz_type: QuizType, show_feedback: bool = False):
+    """Display a single quiz question and record its answer in st.session_state.quiz_answers.
+
+    A fragment, so changing the answer reruns only this question.
+    """
     st.markdown(f"### Question {index+1}")
     
+    # Read the stored dict directly; it was validated when the quiz was saved
+    justification = question_data["justification"]
+    st.write(question_data["question"])
+    
     if quiz_type == QuizType.MULTIPLE_CHOICE:
-        question = MultipleChoiceQuestion(
-            question=question_data["question"],
-            options=question_data["options"],
-            correct_answer=question_data["correct_answer"],
-            justification=question_data["justification"]
-        )
-        st.write(question.question)
-        answer = st.radio(
+        options = question_data["options"]
+        correct_answer = question_data["correct_answer"]
+        # The radio returns the option's index, so no lookup is needed
+        answer_index = st.radio(
             "Choose your answer:",
-            options=question.options,
+            options=range(len(options)),
+            format_func=options.__getitem__,
             key=f"q_{index}",
             index=st.session_state.quiz_answers.get(str(index), 0)
         )
-        answer_index = question.options.index(answer)
         st.session_state.quiz_answers[str(index)] = answer_index
         
         if show_feedback:
-            if answer_index == question.correct_answer:
+            if answer_index == correct_answer:
                 st.success("Correct!")
             else:
-                st.error(f"Incorrect. The correct answer was: {question.options[question.correct_answer]}")
-            
-            # Create columns for explanation and discuss button
-            col1, col2 = st.columns([5, 1])
-            with col1:
-                st.info(f"Explanation: {question.justification}")
-            with col2:
-                if st.button("Discuss", key=f"discuss_{index}"):
-                    st.session_state.active_discussion_question = index
-                    st.rerun()
-            
-        return str(answer_index)
+                st.error(f"Incorrect. The correct answer was: {options[correct_answer]}")
         
     else:  # Fill in the blank
-        question = FillInBlankQuestion(
-            question=question_data["question"],
-            correct_answer=question_data["correct_answer"],
-            justification=question_data["justification"]
-        )
-        st.write(question.question)
+        correct_answer = question_data["correct_answer"]
         answer = st.text_input(
             "Your answer:",
             key=f"q_{index}",
@@ -173,24 +156,23 @@ def display_question(index: int, question_data: dict, quiz_type: QuizType, show_
         st.session_state.quiz_answers[str(index)] = answer
         
         if show_feedback:
-            if answer.strip().lower() == question.correct_answer.strip().lower():
+            if answer.strip().lower() == correct_answer.strip().lower():
                 st.success("Correct!")
             else:
-                st.error(f"Incorrect. The correct answer was: {question.correct_answer}")
-            
-            # Create columns for explanation and discuss button
-            col1, col2 = st.columns([5, 1])
-            with col1:
-                st.info(f"Explanation: {question.justification}")
-            with col2:
-                if st.button("Discuss", key=f"discuss_{index}"):
-                    st.session_state.active_discussion_question = index
-                    st.rerun()
-            
-        return answer
+                st.error(f"Incorrect. The correct answer was: {correct_answer}")
+    
+    if show_feedback:
+        # Create columns for explanation and discuss button
+        col1, col2 = st.columns([5, 1])
+        with col1:
+            st.info(f"Explanation: {justification}")
+        with col2:
+            if st.button("Discuss", key=f"discuss_{index}"):
+                st.session_state.active_discussion_question = index
+                st.rerun()
 
-async def calculate_quiz_score(quiz_data, answers: Dict[str, str]) -> Tuple[float, List[int]]:
-    """Calculate quiz score from answers."""
+async def calculate_quiz_score(quiz_data, answers: Dict[str, str], quiz_type: QuizType) -> Tuple[float, List[int]]:
+    """Calculate quiz score from answers, given the quiz type already resolved by the caller."""
     if not quiz_data or not quiz_data.questions:
         st.error("No quiz data or questions available for scoring")
         return 0.0, []
@@ -199,8 +181,6 @@ async def calculate_quiz_score(quiz_data, answers: Dict[str, str]) -> Tuple[floa
     total_questions = len(quiz_data.questions)
     incorrect_questions = []
     
-    quiz_type = QuizType(quiz_data.type.value if hasattr(quiz_data.type, 'value') else quiz_data.type)
-    
     for i, q in enumerate(quiz_data.questions):
         answer = answers.get(str(i))
         
@@ -234,19 +214,30 @@ async def display_quiz(section, show_feedback: bool = False) -> Tuple[float, Dic
             st.warning("Quiz data could not be loaded or has no questions.")
             return 0, {}, []
             
-        quiz_type = QuizType(quiz_data.type.value if hasattr(quiz_data.type, 'value') else quiz_data.type)
+        quiz_type = _QUIZ_TYPES[quiz_data.type]
         
         if 'quiz_answers' not in st.session_state:
             st.session_state.quiz_answers = {}
             
-        answers = {}
-        
         for i, question in enumerate(quiz_data.questions):
-            answer = display_question(i, question, quiz_type, show_feedback)
-            answers[str(i)] = answer
+            display_question(i, question, quiz_type, show_feedback)
             st.markdown("---")
+        
+        # Fragments do not hand back values, so read the recorded answers;
+        # every question has just written its own on this full run
+        answers = {
+            str(i): str(st.session_state.quiz_answers[str(i)])
+            for i in range(len(quiz_data.questions))
+        }
             
-        score, incorrect_questions = await calculate_quiz_score(quiz_data, answers)
+        # After submission the grade is stored per section; reuse it unless
+        # an answer has been changed since
+        grade = st.session_state.get("quiz_grades", {}).get(str(section.id))
+        if st.session_state.quiz_submitted and grade is not None and grade[0] == answers:
+            _, score, incorrect_questions = grade
+            return score, answers, incorrect_questions
+        
+        score, incorrect_questions = await calculate_quiz_score(quiz_data, answers, quiz_type)
         return score, answers, incorrect_questions
             
     except Exception as e:
@@ -255,6 +246,10 @@ async def display_quiz(section, show_feedback: bool = False) -> Tuple[float, Dic
         st.error(f"Traceback: {traceback.format_exc()}")
         return 0, {}, []
 
+def request_quiz_submit():
+    """Submit Quiz callback; take_quiz_page saves the attempt in the run that follows."""
+    st.session_state.quiz_submit_requested = True
+
 async def save_quiz_attempt(course_id: int, section_id: str, score: float, answers: Dict, incorrect_questions: List[int]) -> bool:
     """Save a quiz attempt to the backend."""
     try:
@@ -299,7 +294,11 @@ def handle_navigation(sections: List, current_index: int, course_id: int):
                     st.rerun()
             else:
                 if st.button("Complete Course", use_container_width=True):
-                    StudentProgressHandler.mark_course_completed(course_id)
+                    # Save in the background on the database loop; main()
+                    # waits for it at the start of the next run
+                    st.session_state.setdefault("pending_progress_writes", []).append(
+                        submit_to_db_loop(StudentProgressHandler.mark_course_completed(course_id))
+                    )
                     st.success("Congratulations! You've completed the course!")
                     st.session_state.current_page = "course_index"
                     st.rerun()
@@ -330,8 +329,12 @@ async def take_quiz_page():
         return
         
     try:
-        # Fetch course data
-        course = await CourseViewHandler.get_course(st.session_state.selected_course_id)
+        # Fetch the course and the student's quiz attempts together; the
+        # attempts are keyed by section, so they do not wait on the course
+        course, quiz_histories = await asyncio.gather(
+            CourseViewHandler.get_course(st.session_state.selected_course_id),
+            StudentProgressHandler.get_quiz_histories(st.session_state.selected_course_id)
+        )
         if not course:
             st.error("Course not found")
             st.session_state.current_page = "course_index"
@@ -339,7 +342,8 @@ async def take_quiz_page():
             return
             
         # Get current section
-        sections = sorted(course.outline_sections, key=lambda x: x.order)
+        # Already in outline order from get_course
+        sections = list(course.outline_sections)
         current_section = sections[st.session_state.current_section_index]
         section_id = str(current_section.id)
         course_id = int(course.id)
@@ -349,27 +353,32 @@ async def take_quiz_page():
         st.write(current_section.description)
         
         # Show previous attempts
-        status, attempts = await StudentProgressHandler.get_section_progress(course_id, section_id)
-        display_previous_attempts(attempts)
+        display_previous_attempts(quiz_histories.get(section_id, []))
         
         # Initialize quiz state
         if 'quiz_submitted' not in st.session_state:
             st.session_state.quiz_submitted = False
             st.session_state.quiz_score = 0
         
+        # Set by the Submit Quiz callback before this run starts, so the
+        # questions can show their feedback without a second run
+        submitting = st.session_state.pop("quiz_submit_requested", False)
+        
         # Display quiz and get score
         score, answers, incorrect_questions = await display_quiz(
             current_section, 
-            show_feedback=st.session_state.quiz_submitted
+            show_feedback=st.session_state.quiz_submitted or submitting
         )
         
+        if submitting:
+            if await save_quiz_attempt(course_id, section_id, score, answers, incorrect_questions):
+                st.session_state.quiz_submitted = True
+                st.session_state.quiz_score = score
+                st.session_state.setdefault("quiz_grades", {})[section_id] = (answers, score, incorrect_questions)
+        
         # Show submit button if not submitted
         if not st.session_state.quiz_submitted:
-            if st.button("Submit Quiz"):
-                if await save_quiz_attempt(course_id, section_id, score, answers, incorrect_questions):
-                    st.session_state.quiz_submitted = True
-                    st.session_state.quiz_score = score
-                    st.rerun()
+            st.button("Submit Quiz", on_click=request_quiz_submit)
         else:
             st.success(f"Quiz completed! Score: {score:.1f}%")
             
@@ -379,7 +388,7 @@ async def take_quiz_page():
                 question_index = st.session_state.active_discussion_question
                 question_data = quiz_data.questions[question_index]
                 user_answer = answers[str(question_index)]
-                quiz_type = QuizType(quiz_data.type.value if hasattr(quiz_data.type, 'value') else quiz_data.type)
+                quiz_type = _QUIZ_TYPES[quiz_data.type]
                 
                 await display_chat_interface(
                     course_id,